@@ -0,0 +1,61 @@
+"""Compare the sync (threadpool) and async (AsyncEngine) database modes at high concurrency.
+
+    python -m src.benchmarks.bench_db_modes --concurrency 200 --requests 5000
+
+Each mode runs in its own process because DATABASE_URL is read at import time. By
+default both use a temporary SQLite file; pass --sync-url/--async-url to compare
+against PostgreSQL (postgresql+psycopg2://... vs postgresql+asyncpg://...).
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from .common import drive, login, run_in_subprocess
+
+
+async def worker(concurrency: int, requests: int, tasks: int) -> dict:
+    from httpx import ASGITransport, AsyncClient
+    from ..databases import database
+    from ..main import app
+
+    database.create_db()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://bench') as client:
+        headers = await login(client)
+        for i in range(tasks):
+            await client.post('/api/v1/tasks/', headers=headers,
+                json={'name': f'task {i}', 'description': 'benchmark task description'})
+
+        result = await drive(
+            lambda: client.get('/api/v1/tasks/', params={'limit': 10}, headers=headers),
+            total=requests, concurrency=concurrency)
+    return {'async_mode': database.ASYNC_MODE, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--sync-url')
+    parser.add_argument('--async-url')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(worker(args.concurrency, args.requests, args.tasks))))
+        return
+
+    forwarded = ['--concurrency', str(args.concurrency), '--requests', str(args.requests), '--tasks', str(args.tasks)]
+    with tempfile.TemporaryDirectory() as tmp:
+        urls = {
+            'sync': args.sync_url or f"sqlite:///{os.path.join(tmp, 'sync.db')}",
+            'async': args.async_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'async.db')}",
+        }
+        results = {mode: run_in_subprocess(__spec__.name, url, forwarded) for mode, url in urls.items()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Page-N latency of offset vs keyset (cursor) pagination on a large tasks table.
+
+    python -m src.benchmarks.bench_pagination --rows 2000000
+
+Seeds --rows tasks (skipped when the table already has them) and times fetching a
+page at increasing depths. Offset latency grows with the depth, keyset stays flat.
+Uses DATABASE_URL, or a temporary SQLite file when it is not set.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+
+def seed(db, schemas, rows: int, chunk: int = 10000):
+    from sqlalchemy import func, insert, select
+
+    existing = db.scalar(select(func.count()).select_from(schemas.Task))
+    base = datetime(2024, 1, 1)
+    for start in range(existing, rows, chunk):
+        db.execute(insert(schemas.Task), [
+            # pairs of rows share a timestamp so the id tie-breaker is exercised
+            {'id': uuid4(), 'name': f'task {i}', 'description': 'pagination benchmark',
+             'status': 'pending', 'created_at': base + timedelta(milliseconds=i // 2)}
+            for i in range(start, min(start + chunk, rows))
+        ])
+        db.commit()
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pagination.db')}")
+    from ..databases import database
+    from ..schemas import schemas
+    from ..utils import crud
+
+    database.create_db()
+    results = []
+    with database.SessionLocal() as db:
+        seed(db, schemas, args.rows)
+        depth = args.limit
+        while depth < args.rows:
+            # The cursor a client would hold after reading `depth` rows.
+            last = crud.get_tasks(db, offset=depth - 1, limit=1)[0]
+            after = (last.created_at, last.id)
+            results.append({
+                'depth': depth,
+                'offset_ms': timed(lambda: crud.get_tasks(db, offset=depth, limit=args.limit), args.repeat),
+                'cursor_ms': timed(lambda: crud.get_tasks(db, limit=args.limit, after=after), args.repeat),
+            })
+            depth *= 10
+    print(json.dumps({'rows': args.rows, 'limit': args.limit, 'pages': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
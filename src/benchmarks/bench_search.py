@@ -0,0 +1,80 @@
+"""Latency of ranked full-text task search over a large synthetic corpus.
+
+    python -m src.benchmarks.bench_search --rows 1000000
+
+Seeds --rows tasks of random words (skipped when the table already has them), then
+times /tasks/search's query (crud.search_tasks) for common, rare and multi-word terms.
+Uses DATABASE_URL (PostgreSQL tsvector + GIN), or a temporary SQLite file (FTS5).
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from uuid import uuid4
+
+from .common import percentiles
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return sorted({''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)})
+
+
+def seed(db, schemas, rows: int, words: list[str], rng: random.Random, chunk: int = 10000):
+    from itertools import accumulate
+    from sqlalchemy import func, insert, select
+
+    # Zipf-like weights: a few words are in most tasks, most words are rare.
+    weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    existing = db.scalar(select(func.count()).select_from(schemas.Task))
+    for start in range(existing, rows, chunk):
+        db.execute(insert(schemas.Task), [
+            {'id': uuid4(), 'name': ' '.join(rng.choices(words, cum_weights=weights, k=3)),
+             'description': ' '.join(rng.choices(words, cum_weights=weights, k=20)), 'status': 'pending'}
+            for _ in range(start, min(start + chunk, rows))
+        ])
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--words', type=int, default=20000, help='vocabulary size')
+    parser.add_argument('--queries', type=int, default=200, help='queries per term class')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}")
+    from ..databases import database
+    from ..schemas import schemas
+    from ..utils import crud
+
+    rng = random.Random(42)
+    words = vocabulary(args.words, rng)
+    database.create_db()
+    with database.SessionLocal() as db:
+        started = time.perf_counter()
+        seed(db, schemas, args.rows, words, rng)
+        seeded_s = round(time.perf_counter() - started, 1)
+
+        terms = {
+            'common': lambda: words[rng.randrange(10)],
+            'rare': lambda: words[rng.randrange(len(words) // 2, len(words))],
+            'two_words': lambda: f'{words[rng.randrange(100)]} {words[rng.randrange(1000)]}',
+        }
+        results = {}
+        for name, term in terms.items():
+            latencies = []
+            for _ in range(args.queries):
+                q = term()
+                started = time.perf_counter()
+                crud.search_tasks(db, q=q, limit=args.limit)
+                latencies.append(time.perf_counter() - started)
+            results[name] = percentiles(latencies)
+    print(json.dumps({'rows': args.rows, 'backend': database.engine.dialect.name, 'seed_s': seeded_s, 'queries': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Serialization cost of a 100-item list page: FastAPI's response_model path vs the dump_json fast path.
+
+    python -m src.benchmarks.bench_serialization --items 100 --repeat 2000
+
+Builds transient ORM rows (no database) and times turning them into response bytes:
+``current`` validates through the route's response field, runs ``serialize`` and renders
+a JSONResponse (json.dumps); ``fast`` is ``utils.serialization.dump_json``.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from ..models import models
+from ..schemas import schemas
+from ..utils.serialization import dump_json
+from .common import percentiles
+
+
+def make_tasks(count: int, owner_id=None) -> list:
+    base = datetime(2024, 1, 1)
+    return [
+        schemas.Task(id=uuid4(), name=f'task {i}', description='serialization benchmark task', status='pending',
+                     owner_id=owner_id, created_at=base + timedelta(seconds=i), updated_at=base + timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+def make_users(count: int, tasks_per_user: int) -> list:
+    base = datetime(2024, 1, 1)
+    users = []
+    for i in range(count):
+        user = schemas.User(id=uuid4(), name=f'user {i}', email=f'user{i}@mail.com', hashed_password='x' * 60,
+                            is_active=True, created_at=base, updated_at=base)
+        user.tasks = make_tasks(tasks_per_user, owner_id=user.id)
+        users.append(user)
+    return users
+
+
+def run_now(coroutine):
+    # serialize_response never awaits for async routes; step it without an event loop.
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError('serialize_response suspended')
+
+
+def current_path(type_):
+    field = create_model_field(name='Response', type_=type_, mode='serialization')
+
+    def render(rows) -> bytes:
+        content = run_now(serialize_response(field=field, response_content=rows))
+        return JSONResponse(content).body
+    return render
+
+
+def timed(render, rows, repeat: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(rows)
+        latencies.append(time.perf_counter() - started)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--tasks-per-user', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    pages = {
+        'tasks': (list[models.Task], make_tasks(args.items)),
+        'users': (list[models.User], make_users(args.items, args.tasks_per_user)),
+    }
+    results = {}
+    for name, (type_, rows) in pages.items():
+        current = current_path(type_)
+        assert json.loads(current(rows)) == json.loads(dump_json(type_, rows))
+        results[name] = {
+            'current': timed(current, rows, args.repeat),
+            'fast': timed(lambda rows: dump_json(type_, rows), rows, args.repeat),
+        }
+    print(json.dumps({'items': args.items, 'tasks_per_user': args.tasks_per_user, 'pages': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+### Shared helpers for the benchmark scripts.
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def percentiles(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+async def login(client, email: str = 'bench@mail.com', password: str = 'bench123') -> dict:
+    """Register (if needed) and log in a benchmark user, return the auth headers."""
+    await client.post('/users/me/', json={'name': 'bench', 'email': email, 'password': password})
+    response = await client.post('/token', data={'username': email, 'password': password})
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+async def drive(send, total: int, concurrency: int) -> dict:
+    """Call ``send()`` ``total`` times from ``concurrency`` workers, report throughput and latency."""
+    latencies, errors, issued = [], 0, 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            issued += 1
+            started = time.perf_counter()
+            response = await send()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies), 'errors': errors, 'concurrency': concurrency,
+        'rps': round(len(latencies) / elapsed, 1), **percentiles(latencies),
+    }
+
+
+def run_in_subprocess(module: str, database_url: str, args: list[str]) -> dict:
+    """Run ``module --worker`` with its own DATABASE_URL (read at import time) and parse its JSON result."""
+    env = {**os.environ, 'DATABASE_URL': database_url}
+    output = subprocess.run(
+        [sys.executable, '-m', module, '--worker', *args],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
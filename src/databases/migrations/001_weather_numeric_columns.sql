@@ -0,0 +1,16 @@
+-- PostgreSQL: convert the weather measurements of an existing database from text to numbers
+-- and add the (country, created_at) index. New databases get both from create_db.
+-- Values that are not numbers become NULL.
+BEGIN;
+
+ALTER TABLE weather
+    ALTER COLUMN temperature TYPE double precision
+        USING CASE WHEN temperature ~ '^-?[0-9]+(\.[0-9]+)?$' THEN temperature::double precision END,
+    ALTER COLUMN humidity TYPE smallint
+        USING CASE WHEN humidity ~ '^[0-9]+(\.[0-9]+)?$' THEN round(humidity::numeric)::smallint END,
+    ALTER COLUMN wind_speed TYPE double precision
+        USING CASE WHEN wind_speed ~ '^-?[0-9]+(\.[0-9]+)?$' THEN wind_speed::double precision END;
+
+CREATE INDEX IF NOT EXISTS ix_weather_country_created_at ON weather (country, created_at);
+
+COMMIT;
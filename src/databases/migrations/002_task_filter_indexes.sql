@@ -0,0 +1,7 @@
+-- PostgreSQL: add the task filter and sort indexes to an existing database.
+-- New databases get them from create_db, which does not add indexes to existing tables.
+-- CONCURRENTLY keeps the table writable while they build, so no transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_owner_id_created_at_id ON tasks (owner_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_status_created_at_id ON tasks (status, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_updated_at_id ON tasks (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_name_pattern ON tasks (name text_pattern_ops);
@@ -0,0 +1,6 @@
+-- PostgreSQL: add the (created_at, id) indexes behind cursor pagination to an existing database.
+-- New databases get them from create_db, which does not add indexes to existing tables.
+-- CONCURRENTLY keeps the tables writable while they build, so no transaction block.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_created_at_id ON users (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_created_at_id ON tasks (created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_weather_created_at_id ON weather (created_at, id);
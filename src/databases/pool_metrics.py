@@ -0,0 +1,91 @@
+### Connection pool instrumentation built on SQLAlchemy pool events.
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+from ..utils.metrics import Histogram
+
+
+class PoolMetrics:
+    """Count pool events of an engine and time how long callers wait for a connection.
+
+    Create the engine with ``poolclass=metrics.pool_class(url)``, then ``instrument(engine)``.
+    The listeners are registered on the engine and the timed class is kept by ``Pool.recreate()``,
+    so both follow ``engine.dispose()``; the gauges read ``engine.pool`` each time.
+
+    The checkout wait is measured around ``Pool.connect()``: it includes waiting for a
+    free connection and opening a new one when the pool may still grow.
+    """
+
+    def __init__(self):
+        self.engine: Engine | None = None
+        self.checkout_wait = Histogram()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.checkout_timeouts = 0
+
+    def pool_class(self, url) -> type:
+        """The dialect's default pool class for ``url``, with a timed ``connect()``."""
+        base = url.get_dialect().get_pool_class(url)
+        metrics = self
+
+        class TimedPool(base):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    return super().connect()
+                except exc.TimeoutError:
+                    metrics.checkout_timeouts += 1
+                    raise
+                finally:
+                    metrics.checkout_wait.observe(time.perf_counter() - started)
+
+        TimedPool.__name__ = TimedPool.__qualname__ = base.__name__
+        return TimedPool
+
+    def instrument(self, engine: Engine) -> Engine:
+        self.engine = engine
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'soft_invalidate', self._on_soft_invalidate)
+        return engine
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        self.soft_invalidations += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.pool  # replaced by engine.dispose()
+        gauges = {
+            name: getattr(pool, name)()
+            for name in ('size', 'checkedin', 'checkedout', 'overflow') if callable(getattr(pool, name, None))
+        }
+        if 'overflow' in gauges:  # QueuePool reports a negative overflow while below pool_size
+            gauges['overflow_in_use'] = max(0, gauges['overflow'])
+        return {
+            'pool': type(pool).__name__,
+            **gauges,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+            'connects': self.connects,
+            'invalidations': self.invalidations,
+            'soft_invalidations': self.soft_invalidations,
+            'checkout_timeouts': self.checkout_timeouts,
+            'checkout_wait_seconds': self.checkout_wait.snapshot(),
+        }
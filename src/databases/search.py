@@ -0,0 +1,53 @@
+### Full-text search over tasks.name and tasks.description.
+# PostgreSQL: a generated tsvector column with a GIN index. SQLite (local runs): an FTS5
+# external-content table kept in sync by triggers. Both are created idempotently by create_db.
+from sqlalchemy import text
+
+
+SEARCH_LANGUAGE = 'english'
+
+POSTGRESQL_DDL = [
+    f"""ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(description, '')), 'B')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+]
+
+# The FTS rows point at tasks.rowid. Tasks have a UUID primary key, so a VACUUM may renumber
+# rowids: run INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild') after one.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(name, description, content='tasks', content_rowid='rowid')",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF name, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO tasks_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END""",
+]
+
+
+def create_search_index(connection):
+    if connection.dialect.name == 'postgresql':
+        for statement in POSTGRESQL_DDL:
+            connection.execute(text(statement))
+    elif connection.dialect.name == 'sqlite':
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")).first()
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:  # index the tasks written before search existed
+            connection.execute(text("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')"))
+
+
+def drop_search_index(connection):
+    # The FTS5 table is not part of the metadata; left behind it would point at reused rowids.
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS tasks_fts"))
+
+
+def fts5_query(q: str) -> str:
+    # Every word quoted, so user input is matched as text, never as FTS5 query syntax.
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in q.split())
@@ -1,19 +1,38 @@
-import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from .routers.tasks_router import router as task_router
 from .routers.users_router import router as user_router
+from .routers.internal_router import router as internal_router
+from .routers.metrics_router import router as metrics_router
 from .utils.oauth2_jwt import router as oauth2_jwt_router
-from .utils.middleware import log_request
-from .databases.database import create_db as metadata_db_migrations
+from .utils import hashing, http_client
+from .utils.request_metrics import MetricsMiddleware
+from .utils.middleware import log_request, pipeline as enrichment_pipeline, weather_buffer, weather_retention, ENRICHMENT_SHUTDOWN_TIMEOUT
+from .databases.database import migrations_on_startup, create_db_when_ready as metadata_db_migrations
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if migrations_on_startup():
+        await run_in_threadpool(metadata_db_migrations)  # create all database migrations config.
+    await http_client.start_client()  # shared pooled client for outbound calls
+    await weather_buffer.start()  # batched weather inserts
+    await enrichment_pipeline.start()  # background geo-ip/weather workers
+    await weather_retention.start()  # rolling delete of old weather rows, if enabled
+    yield
+    await weather_retention.stop()
+    await enrichment_pipeline.stop(timeout=ENRICHMENT_SHUTDOWN_TIMEOUT)  # flush queued requests
+    await weather_buffer.stop()  # write the remaining weather rows
+    await http_client.close_client()
+    hashing.shutdown()
 
 
 app = FastAPI(
     title='Task Challenge', description='Technical Challenge - Fastapi', docs_url='/swagger-ui', 
-    version='1.0.0', summary='Task API and auth using oauth2-jwt.')
-
-metadata_db_migrations()  # create all database migrations config.
+    version='1.0.0', summary='Task API and auth using oauth2-jwt.', lifespan=lifespan)
 
 origins = [
     "http://localhost:8000",
@@ -22,15 +41,19 @@ origins = [
 
 app.add_middleware(CORSMiddleware, 
     allow_origins=origins, allow_credentials=True,
-    allow_methods=["*"], allow_headers=["*"],
+    allow_methods=["*"], allow_headers=["*"], expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 app.middleware('http')(log_request)
+app.add_middleware(MetricsMiddleware)  # outermost, times everything below it
 
 ### ROUTERS
 app.include_router(oauth2_jwt_router)  # FROM OAUTH2 JWT AUTHENTICATED - AUTHORIZED
 app.include_router(user_router)
 app.include_router(task_router)
+app.include_router(internal_router)
+app.include_router(metrics_router)
 
 
 if __name__ == '__main__':
+    import uvicorn
     uvicorn.run(app='main:app', host='0.0.0.0', port=8000, reload=True)
@@ -2,7 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional
 from uuid import UUID, uuid4
 from enum import Enum
-from datetime import datetime
+from datetime import date, datetime
 
 class StatusEnum(str, Enum):
     PENDING = 'pending'
@@ -11,6 +11,20 @@ class StatusEnum(str, Enum):
     FINISHED = 'finished'
 
 
+class ExportFormatEnum(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class TaskSortEnum(str, Enum):
+    CREATED_AT = 'created_at'
+    CREATED_AT_DESC = '-created_at'
+    UPDATED_AT = 'updated_at'
+    UPDATED_AT_DESC = '-updated_at'
+    NAME = 'name'
+    NAME_DESC = '-name'
+
+
 class TaskBase(BaseModel):
     name: str = Field(title='Name', max_length=100, min_length=4)
     description: str = Field(title='Description', min_length=10)
@@ -27,6 +41,14 @@ class TaskUpdate(TaskBase):
     status: Optional[StatusEnum] = None
 
 
+class TaskBulkCreate(TaskCreate):
+    owner_id: UUID | None = Field(title='Owner_ID', default=None)
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: UUID = Field(title='ID')
+
+
 class Task(TaskBase):
     id: UUID = Field(title='ID', default_factory=uuid4)
     owner_id: UUID | None = Field(title='Owner_ID', default_factory=uuid4)
@@ -37,6 +59,21 @@ class Task(TaskBase):
         from_attributes = True
 
 
+class BulkItemResult(BaseModel):
+    index: int = Field(title='Index', description='Position of the item in the request.')
+    id: UUID | None = Field(title='ID', default=None)
+    status: int = Field(title='Status', description='HTTP status code of the item.')
+    detail: str | None = Field(title='Detail', default=None)
+    task: Task | None = Field(title='Task', default=None)
+
+
+class TaskStats(BaseModel):
+    owner_id: UUID | None = Field(title='Owner_ID', default=None)
+    status: str = Field(title='Status')
+    day: date | None = Field(title='Day', default=None)
+    count: int = Field(title='Count')
+
+
 class UserBase(BaseModel):
     name: str
     email: str
@@ -53,6 +90,15 @@ class UserUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
+class UserPrincipal(UserBase):
+    # The authenticated caller as cached by oauth2_jwt, no tasks or timestamps.
+    id: UUID = Field(title='ID')
+    is_active: bool | None = Field(title='IsActive', default=True)
+
+    class Config:
+        from_attributes = True
+
+
 class User(UserBase):
     id: UUID = Field(title='ID', default_factory=uuid4)
     is_active: bool | None = Field(title='IsActive', default=True)
@@ -69,6 +115,17 @@ class Weather(BaseModel):
     country: str
     city: str | None = None
     weather: str
-    temperature: str | None = None
-    humidity: str | None = None
-    wind_speed: str | None = None
+    temperature: float | None = None
+    humidity: int | None = None
+    wind_speed: float | None = None
+
+
+class WeatherStats(BaseModel):
+    country: str | None = None
+    city: str | None = None
+    requests: int
+    avg_temperature: float | None = None
+    min_temperature: float | None = None
+    max_temperature: float | None = None
+    avg_humidity: float | None = None
+    avg_wind_speed: float | None = None
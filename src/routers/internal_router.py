@@ -0,0 +1,60 @@
+import os
+import secrets
+from typing import Annotated
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from ..databases import database
+from ..utils import hashing, http_client, middleware, oauth2_jwt, stats
+from ..utils.read_cache import read_cache
+
+
+# Operator token for /internal/*, sent as X-Internal-Token. Unset (default) hides the routes:
+# anyone can register a user, so a user JWT is not enough to read pool, cache and auth internals.
+INTERNAL_TOKEN = os.getenv('INTERNAL_TOKEN', '')
+
+
+async def require_internal_token(x_internal_token: Annotated[str | None, Header(include_in_schema=False)] = None):
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_internal_token is None or not secrets.compare_digest(x_internal_token.encode(), INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
+
+
+router = APIRouter(prefix='/internal', tags=['internal'], include_in_schema=bool(INTERNAL_TOKEN),
+                   dependencies=[Depends(require_internal_token)])
+
+
+@router.get("/pool", tags=['internal'], description='Database connection pool settings and metrics.')
+async def pool_stats():
+    return database.pool_stats()
+
+
+@router.get("/enrichment", tags=['internal'], description='Weather recording policy, enrichment pipeline, lookup caches and write buffer stats.')
+async def enrichment_stats():
+    return {
+        'recording': middleware.recording.stats(),
+        'pipeline': middleware.pipeline.stats(),
+        'write_buffer': middleware.weather_buffer.stats(),
+        'retention': middleware.weather_retention.stats(),
+        'geo_cache': middleware.geo_cache.stats(),
+        'weather_cache': middleware.weather_cache.stats(),
+        'circuit_breaker': http_client.breaker.stats() if http_client.breaker else None,
+    }
+
+
+@router.get("/auth", tags=['internal'], description='Token/user cache and password hashing stats.')
+async def auth_stats():
+    return {
+        'token_cache': oauth2_jwt.token_cache.stats(),
+        'user_cache': oauth2_jwt.user_cache.stats(),
+        'hashing': hashing.stats(),
+    }
+
+
+@router.get("/cache", tags=['internal'], description='Read cache and stats cache metrics.')
+async def cache_stats():
+    return {
+        'read_cache': read_cache.stats(),
+        'task_stats_cache': stats.task_stats_cache.stats(),
+        'weather_stats_cache': stats.weather_stats_cache.stats(),
+    }
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from ..utils.request_metrics import PROMETHEUS_CONTENT_TYPE, request_metrics
+
+
+# Unauthenticated so Prometheus can scrape it; restrict it at the proxy or network level.
+router = APIRouter(tags=['metrics'])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(request_metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,73 +1,257 @@
+import os
+from datetime import datetime
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Path, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from typing import Annotated
 
 from ..databases import database
 from ..models import models
-from ..utils import crud, oauth2_jwt
+from ..utils import async_crud, crud, oauth2_jwt, stats
+from ..utils.etag import if_match_versions, make_etag, not_modified, precondition_failed
+from ..utils.export import export_response
+from ..utils.pagination import page_after, set_next_cursor
+from ..utils.serialization import json_response
 
 
+# Largest batch accepted by the bulk endpoints, and the chunk size of the NDJSON upload.
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 1000))
+
 router = APIRouter(prefix='/api/v1', tags=['tasks'], dependencies=[Depends(oauth2_jwt.get_current_user)])
 
+def task_filters(
+    owner_id: Annotated[UUID | None, Query(title='Owner ID', description='Only tasks of this user.')] = None, 
+    task_status: Annotated[models.StatusEnum | None, Query(alias='status', title='Status', description='Only tasks in this status.')] = None, 
+    created_after: Annotated[datetime | None, Query(title='Created after', description='Created at or after this time.')] = None, 
+    created_before: Annotated[datetime | None, Query(title='Created before', description='Created before this time.')] = None, 
+    updated_after: Annotated[datetime | None, Query(title='Updated after', description='Updated at or after this time.')] = None, 
+    updated_before: Annotated[datetime | None, Query(title='Updated before', description='Updated before this time.')] = None, 
+    name_prefix: Annotated[str | None, Query(title='Name prefix', description='Only tasks whose name starts with this text.', max_length=100)] = None) -> dict:
+
+    return dict(owner_id=owner_id, status=task_status, created_after=created_after, created_before=created_before,
+                updated_after=updated_after, updated_before=updated_before, name_prefix=name_prefix)
+
+
 @router.get("/tasks/", response_model=list[models.Task], tags=['tasks'], description='Retrieve all tasks.')
-def find_tasks(
+async def find_tasks(
+    response: Response,
     limit: Annotated[int | None, Query(title='Limit', description='Paging limit variable.', ge=0, le=100)] = 10, 
     offset: Annotated[int | None, Query(title='Offset', description='Paging offset variable.', ge=0)] = 0, 
-    db: Session = Depends(database.get_db)):
+    cursor: Annotated[str | None, Query(title='Cursor', description='Keyset paging cursor, from the X-Next-Cursor header.')] = None, 
+    sort: Annotated[models.TaskSortEnum, Query(title='Sort', description='Sort key, "-" prefix for descending. Cursors need created_at.')] = models.TaskSortEnum.CREATED_AT, 
+    filters: dict = Depends(task_filters),
+    db: database.DBSession = Depends(database.get_db)):
+
+    rows = await async_crud.get_tasks(db, offset=offset, limit=limit, after=page_after(cursor, offset, sort.value), filters=filters, sort=sort.value)
+    set_next_cursor(response, rows, limit, sort.value)
+    return json_response(list[models.Task], rows, response)
+
 
-    return crud.get_tasks(db, offset=offset, limit=limit)
+@router.get("/tasks/stats", response_model=list[models.TaskStats], tags=['tasks'], description='Count tasks per owner and status, optionally per creation day.')
+async def task_stats(
+    by_day: Annotated[bool, Query(title='By day', description='Also group by the day the task was created.')] = False, 
+    filters: dict = Depends(task_filters),
+    db: database.DBSession = Depends(database.get_db)):
+
+    key = stats.task_stats_key(by_day=by_day, **filters)
+    if (rows := stats.task_stats_cache.get(key)) is None:
+        rows = [models.TaskStats(**row) for row in await async_crud.task_stats(db, filters=filters, by_day=by_day)]
+        stats.task_stats_cache.set(key, rows)
+    return rows
+
+
+@router.get("/tasks/search", response_model=list[models.Task], tags=['tasks'], description='Full-text search over task names and descriptions, best match first.')
+async def search_tasks(
+    response: Response,
+    q: Annotated[str, Query(title='Query', description='Words to search for.', min_length=1, max_length=200)], 
+    limit: Annotated[int | None, Query(title='Limit', description='Paging limit variable.', ge=0, le=100)] = 10, 
+    offset: Annotated[int | None, Query(title='Offset', description='Paging offset variable.', ge=0)] = 0, 
+    db: database.DBSession = Depends(database.get_db)):
+
+    rows = await async_crud.search_tasks(db, q=q, offset=offset, limit=limit)
+    return json_response(list[models.Task], rows, response)
+
+
+@router.get("/tasks/export", tags=['tasks'], response_class=StreamingResponse,
+            description='Stream all tasks matching the filters as NDJSON or CSV.')
+async def export_tasks(
+    format: Annotated[models.ExportFormatEnum, Query(title='Format', description='ndjson or csv.')] = models.ExportFormatEnum.NDJSON, 
+    filters: dict = Depends(task_filters)):
+
+    return export_response(crud.export_tasks(**filters), format, 'tasks')
 
 
 @router.get("/tasks/{id}", response_model=models.Task, tags=['tasks'], description='Retrieve a task filtered by ID.')
-def find_task(id: UUID = Path(description='Tasks ID'), db: Session = Depends(database.get_db)):
+async def find_task(
+    request: Request, response: Response,
+    id: UUID = Path(description='Tasks ID'), db: database.DBSession = Depends(database.get_db)):
 
-    if db_task := crud.get_task(db, task_id=id):
+    if db_task := await async_crud.get_task(db, task_id=id):
+        etag = make_etag(db_task.id, db_task.updated_at)
+        if unchanged := not_modified(request, etag):
+            return unchanged  # 304, the task is not serialized
+        response.headers['ETag'] = etag
         return db_task
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Task with {id=} not found")
 
 
 @router.get("/tasks/users/{id}", response_model=list[models.Task], tags=['tasks'], description='Retrieve all User\'s tasks.')
-def find_user_tasks(
+async def find_user_tasks(
+    response: Response,
     limit: Annotated[int | None, Query(title='Limit', description='Paging limit variable.', ge=0, le=100)] = 10, 
     offset: Annotated[int | None, Query(title='Offset', description='Paging offset variable.', ge=0)] = 0, 
-    id: UUID = Path(description='User ID'), db: Session = Depends(database.get_db)):
+    cursor: Annotated[str | None, Query(title='Cursor', description='Keyset paging cursor, from the X-Next-Cursor header.')] = None, 
+    id: UUID = Path(description='User ID'), db: database.DBSession = Depends(database.get_db)):
 
-    return crud.get_user_tasks(db=db, user_id=id, offset=offset, limit=limit)
+    rows = await async_crud.get_user_tasks(db=db, user_id=id, offset=offset, limit=limit, after=page_after(cursor, offset))
+    set_next_cursor(response, rows, limit)
+    return json_response(list[models.Task], rows, response)
 
 
 @router.post("/tasks/", response_model=models.Task, tags=['tasks'], description='Add Task.')
-def create_task(
-    task: models.TaskCreate, db: Session = Depends(database.get_db)):
+async def create_task(
+    task: models.TaskCreate, db: database.DBSession = Depends(database.get_db)):
 
-    if db_task := crud.create_task(db=db, task=task):
+    if db_task := await async_crud.create_task(db=db, task=task):
         return db_task
     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error creating a task")
 
 
 @router.post("/tasks/users/{id}", response_model=models.Task, tags=['tasks'], description='Add User\'s task.')
-def create_task_for_user(
+async def create_task_for_user(
     task: models.TaskCreate, id: UUID = Path(description='User ID'), 
-    db: Session = Depends(database.get_db)):
+    db: database.DBSession = Depends(database.get_db)):
 
-    if user_task := crud.create_user_task(db=db, task=task, user_id=id):
+    if user_task := await async_crud.create_user_task(db=db, task=task, user_id=id):
         return user_task
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {id=} not found")
 
 
+### Bulk endpoints: one statement and one commit per batch, a result per item.
+# Declared before PUT and DELETE /tasks/{id} so "bulk" is not read as a task ID there; there is no GET /tasks/bulk.
+
+def bulk_item(index: int, db_task, success: int, id: UUID | None = None, detail: str | None = None) -> models.BulkItemResult:
+    if db_task is None:
+        return models.BulkItemResult(index=index, id=id, status=status.HTTP_404_NOT_FOUND, detail=detail)
+    return models.BulkItemResult(index=index, id=db_task.id, status=success, task=models.Task.model_validate(db_task))
+
+
+async def bulk_create(db: database.DBSession, tasks: list[models.TaskBulkCreate]) -> list[models.BulkItemResult]:
+    created = await async_crud.create_tasks(db=db, tasks=tasks)
+    return [
+        bulk_item(index, db_task, status.HTTP_201_CREATED, detail=f"User with id={task.owner_id} not found")
+        for index, (task, db_task) in enumerate(zip(tasks, created))
+    ]
+
+
+@router.post("/tasks/bulk", response_model=list[models.BulkItemResult], tags=['tasks'], description='Add many Tasks at once.')
+async def create_tasks(
+    tasks: Annotated[list[models.TaskBulkCreate], Body(min_length=1, max_length=BULK_MAX_ITEMS)],
+    db: database.DBSession = Depends(database.get_db)):
+
+    return await bulk_create(db, tasks)
+
+
+@router.patch("/tasks/bulk", response_model=list[models.BulkItemResult], tags=['tasks'], description='Update many Tasks at once.')
+async def update_tasks(
+    tasks: Annotated[list[models.TaskBulkUpdate], Body(min_length=1, max_length=BULK_MAX_ITEMS)],
+    db: database.DBSession = Depends(database.get_db)):
+
+    updated = await async_crud.update_tasks(db=db, tasks=tasks)
+    return [
+        bulk_item(index, db_task, status.HTTP_200_OK, id=task.id, detail=f"Task with id={task.id} not found")
+        for index, (task, db_task) in enumerate(zip(tasks, updated))
+    ]
+
+
+@router.delete("/tasks/bulk", response_model=list[models.BulkItemResult], tags=['tasks'], description='Delete many Tasks by ID at once.')
+async def delete_tasks(
+    ids: Annotated[list[UUID], Body(min_length=1, max_length=BULK_MAX_ITEMS)],
+    db: database.DBSession = Depends(database.get_db)):
+
+    deleted = await async_crud.delete_tasks(db=db, task_ids=ids)
+    return [
+        models.BulkItemResult(index=index, id=id, status=status.HTTP_204_NO_CONTENT) if found else
+        models.BulkItemResult(index=index, id=id, status=status.HTTP_404_NOT_FOUND, detail=f"Task with {id=} not found")
+        for index, (id, found) in enumerate(zip(ids, deleted))
+    ]
+
+
+async def ndjson_lines(request: Request):
+    buffer = b''
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def bulk_create_chunk(db: database.DBSession, chunk: list[tuple[int, models.TaskBulkCreate | models.BulkItemResult]]):
+    # Invalid lines are already results, the valid ones are inserted together and keep their position.
+    created = iter(await bulk_create(db, [item for _, item in chunk if isinstance(item, models.TaskBulkCreate)]))
+    return [(item if isinstance(item, models.BulkItemResult) else next(created)).model_copy(update={'index': index})
+            for index, item in chunk]
+
+
+async def stream_ndjson_results(request: Request):
+    # Reads the body, inserts and commits each chunk and sends its results before reading on,
+    # so memory stays at one chunk. Request dependencies are closed by now: own session.
+    chunk, index = [], 0
+    async with database.open_session() as db:
+        async for line in ndjson_lines(request):
+            try:
+                chunk.append((index, models.TaskBulkCreate.model_validate_json(line)))
+            except ValidationError as e:
+                chunk.append((index, models.BulkItemResult(
+                    index=index, status=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e.errors(include_url=False)))))
+            index += 1
+            if len(chunk) == BULK_MAX_ITEMS:
+                yield ''.join(result.model_dump_json() + '\n' for result in await bulk_create_chunk(db, chunk))
+                chunk = []
+        if chunk:
+            yield ''.join(result.model_dump_json() + '\n' for result in await bulk_create_chunk(db, chunk))
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body reads the request. Starlette's listens for a disconnect on
+    ``receive`` meanwhile, which would swallow body chunks; here a disconnect ends request.stream()."""
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/tasks/bulk/ndjson", tags=['tasks'], response_class=StreamingResponse,
+             description='Add Tasks from an NDJSON body of any size, one task per line. '
+                         'Tasks are inserted and committed in chunks as the body arrives; '
+                         'the response is NDJSON with one result per line, sent chunk by chunk.')
+async def create_tasks_ndjson(request: Request):
+
+    return RequestStreamingResponse(stream_ndjson_results(request), media_type='application/x-ndjson')
+
+
 @router.put("/tasks/{id}", response_model=models.Task, tags=['tasks'], description='Update a Task by ID.')
-def update_task(
+async def update_task(
+    request: Request, response: Response,
     id: UUID = Path(description='Task ID'), task: Annotated[models.TaskUpdate, Body()] = None, 
-    db: Session = Depends(database.get_db)):
+    db: database.DBSession = Depends(database.get_db)):
 
-    if task_updated := crud.update_task(db=db, task_id=id, task=task):
+    versions = if_match_versions(request, id)
+    if task_updated := await async_crud.update_task(db=db, task_id=id, task=task, versions=versions):
+        response.headers['ETag'] = make_etag(task_updated.id, task_updated.updated_at)
         return task_updated
+    if versions is not None and await async_crud.get_task(db, task_id=id):
+        raise precondition_failed()
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Task with {id=} not found")
 
 
 @router.delete("/tasks/{id}", status_code=status.HTTP_204_NO_CONTENT, tags=['tasks'], description='Delete a Task by ID.')
-def delete_task(id: UUID = Path(description='Task ID'), db: Session = Depends(database.get_db)):
+async def delete_task(id: UUID = Path(description='Task ID'), db: database.DBSession = Depends(database.get_db)):
 
-    if crud.delete_task(db=db, task_id=id):
+    if await async_crud.delete_task(db=db, task_id=id):
         return
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Task with {id=} not found")
@@ -1,63 +1,126 @@
+from datetime import datetime
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Path, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status, Depends, Body, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 
 from ..databases import database
 from ..models import models
-from ..utils import crud, oauth2_jwt
+from ..utils import async_crud, crud, oauth2_jwt, stats
+from ..utils.etag import if_match_versions, make_etag, not_modified, precondition_failed
+from ..utils.export import export_response
+from ..utils.pagination import page_after, set_next_cursor
+from ..utils.serialization import json_response
 
 
 router = APIRouter(prefix='/api/v1', tags=['users'], dependencies=[Depends(oauth2_jwt.get_current_user)])
 
 
 @router.get("/users/", response_model=list[models.User], tags=['users'], description='Retrieve all users.')
-def find_users(
+async def find_users(
+    response: Response,
     limit: Annotated[int | None, Query(title='Limit', description='Paging limit variable.', ge=0, le=100)] = 10, 
     offset: Annotated[int | None, Query(title='Offset', description='Paging offset variable.', ge=0)] = 0, 
-    db: Session = Depends(database.get_db)):
+    cursor: Annotated[str | None, Query(title='Cursor', description='Keyset paging cursor, from the X-Next-Cursor header.')] = None, 
+    include_tasks: Annotated[bool, Query(title='Include tasks', description='Embed each user\'s tasks, false returns an empty list.')] = True, 
+    db: database.DBSession = Depends(database.get_db)):
 
-    return crud.get_users(db, offset=offset, limit=limit)
+    rows = await async_crud.get_users(db, offset=offset, limit=limit, after=page_after(cursor, offset), include_tasks=include_tasks)
+    set_next_cursor(response, rows, limit)
+    return json_response(list[models.User], rows, response)
 
 
-@router.get("/users/{id}", response_model=models.User, tags=['users'], description='Retrieve an user filtered by ID.')
-def find_user(id: UUID = Path(description='User ID'), db: Session = Depends(database.get_db)):
+def user_etag(db_user, include_tasks: bool) -> str:
+    # Embedded tasks change the representation without touching the user's updated_at.
+    if include_tasks:
+        return make_etag(db_user.id, db_user.updated_at, [(task.id, task.updated_at) for task in db_user.tasks])
+    return make_etag(db_user.id, db_user.updated_at)
+
 
-    if db_user := crud.get_user(db, user_id=id):
+@router.get("/users/{id}", response_model=models.User, tags=['users'], description='Retrieve an user filtered by ID.')
+async def find_user(
+    request: Request, response: Response,
+    id: UUID = Path(description='User ID'), 
+    include_tasks: Annotated[bool, Query(title='Include tasks', description='Embed each user\'s tasks, false returns an empty list.')] = True, 
+    db: database.DBSession = Depends(database.get_db)):
+
+    if db_user := await async_crud.get_user(db, user_id=id, include_tasks=include_tasks):
+        etag = user_etag(db_user, include_tasks)
+        if unchanged := not_modified(request, etag):
+            return unchanged  # 304, the user is not serialized
+        response.headers['ETag'] = etag
         return db_user
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {id=} not found")
     
 
 @router.post("/users/", response_model=models.User, tags=['users'], description='Add an User data.')
-def create_user(user: Annotated[models.UserCreate, Body()] = None, db: Session = Depends(database.get_db)):
+async def create_user(user: Annotated[models.UserCreate, Body()] = None, db: database.DBSession = Depends(database.get_db)):
 
-    if db_user := crud.get_user_by_email(db, email=user.email):
+    if db_user := await async_crud.get_user_by_email(db, email=user.email, include_tasks=False):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Email: {db_user.email} already registered")
-    return crud.create_user(db=db, user=user)
+    return await async_crud.create_user(db=db, user=user)
 
 
 @router.put("/users/{id}", response_model=models.User, tags=['users'], description='Update an User data by ID.')
-def update_user(
+async def update_user(
+    request: Request, response: Response,
     id: UUID = Path(description='User ID'), user: Annotated[models.UserUpdate, Body()] = None, 
-    db: Session = Depends(database.get_db)):
+    db: database.DBSession = Depends(database.get_db)):
 
-    if user_updated := crud.update_user(db=db, user_id=id, user=user):
+    # If-Match checks the user's own version; the embedded tasks are not part of the update.
+    versions = if_match_versions(request, id)
+    if user_updated := await async_crud.update_user(db=db, user_id=id, user=user, versions=versions):
+        response.headers['ETag'] = user_etag(user_updated, include_tasks=True)
         return user_updated
+    if versions is not None and await async_crud.get_user(db, user_id=id, include_tasks=False):
+        raise precondition_failed()
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {id=} not found")
 
 
 @router.delete("/users/{id}", status_code=status.HTTP_204_NO_CONTENT, tags=['users'], description='Delete an User by ID.')
-def delete_user(id: UUID = Path(description='User ID'), db: Session = Depends(database.get_db)):
+async def delete_user(id: UUID = Path(description='User ID'), db: database.DBSession = Depends(database.get_db)):
 
-    if crud.delete_user(db=db, user_id=id):
+    if await async_crud.delete_user(db=db, user_id=id):
         return
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {id=} not found")
 
 
 @router.get("/weather/", response_model=list[models.Weather], description='Retrieve all weathers.')
-def find_weathers(
+async def find_weathers(
+    response: Response,
     limit: Annotated[int | None, Query(title='Limit', description='Paging limit variable.', ge=0, le=100)] = 10, 
     offset: Annotated[int | None, Query(title='Offset', description='Paging offset variable.', ge=0)] = 0, 
-    db: Session = Depends(database.get_db)):
-
-    return crud.get_weathers(db, offset=offset, limit=limit)
\ No newline at end of file
+    cursor: Annotated[str | None, Query(title='Cursor', description='Keyset paging cursor, from the X-Next-Cursor header.')] = None, 
+    db: database.DBSession = Depends(database.get_db)):
+
+    rows = await async_crud.get_weathers(db, offset=offset, limit=limit, after=page_after(cursor, offset))
+    set_next_cursor(response, rows, limit)
+    return json_response(list[models.Weather], rows, response)
+
+
+@router.get("/weather/stats", response_model=list[models.WeatherStats], description='Weather aggregates per country, optionally per city, over a time window.')
+async def weather_stats(
+    by_city: Annotated[bool, Query(title='By city', description='Also group by city.')] = False, 
+    country: Annotated[str | None, Query(title='Country', description='Only requests from this country.')] = None, 
+    created_after: Annotated[datetime | None, Query(title='Created after', description='Created at or after this time.')] = None, 
+    created_before: Annotated[datetime | None, Query(title='Created before', description='Created before this time.')] = None, 
+    db: database.DBSession = Depends(database.get_db)):
+
+    params = dict(country=country, created_after=created_after, created_before=created_before, by_city=by_city)
+    key = tuple(sorted(params.items()))
+    if (rows := stats.weather_stats_cache.get(key)) is None:
+        rows = [models.WeatherStats(**row) for row in await async_crud.weather_stats(db, **params)]
+        stats.weather_stats_cache.set(key, rows)
+    return rows
+
+
+@router.get("/weather/export", response_class=StreamingResponse, description='Stream all weathers matching the filters as NDJSON or CSV.')
+async def export_weathers(
+    format: Annotated[models.ExportFormatEnum, Query(title='Format', description='ndjson or csv.')] = models.ExportFormatEnum.NDJSON, 
+    hostname: Annotated[str | None, Query(title='Hostname', description='Only requests from this host.')] = None, 
+    country: Annotated[str | None, Query(title='Country', description='Only requests from this country.')] = None, 
+    created_after: Annotated[datetime | None, Query(title='Created after', description='Created at or after this time.')] = None, 
+    created_before: Annotated[datetime | None, Query(title='Created before', description='Created before this time.')] = None):
+
+    statement = crud.export_weathers(hostname=hostname, country=country, created_after=created_after, created_before=created_before)
+    return export_response(statement, format, 'weather')
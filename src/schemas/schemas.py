@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String, UUID, DateTime, func
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Index, SmallInteger, String, UUID, DateTime, func
 from sqlalchemy.orm import relationship
 
 from ..databases.database import Base
@@ -6,6 +6,9 @@ from ..databases.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),  # keyset pagination order
+    )
 
     id = Column(UUID, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
@@ -20,6 +23,15 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index('ix_tasks_created_at_id', 'created_at', 'id'),  # keyset pagination order
+        # Filters on owner or status, then the default (created_at, id) order.
+        Index('ix_tasks_owner_id_created_at_id', 'owner_id', 'created_at', 'id'),
+        Index('ix_tasks_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('ix_tasks_updated_at_id', 'updated_at', 'id'),
+        # Name prefix (LIKE 'abc%') on PostgreSQL, whose default collation cannot use ix_tasks_name.
+        Index('ix_tasks_name_pattern', 'name', postgresql_ops={'name': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
 
     id = Column(UUID, primary_key=True, index=True)
     name = Column(String(100), index=True)
@@ -35,15 +47,19 @@ class Task(Base):
 
 class Weather(Base):
     __tablename__ = "weather"
+    __table_args__ = (
+        Index('ix_weather_created_at_id', 'created_at', 'id'),  # keyset pagination order, retention
+        Index('ix_weather_country_created_at', 'country', 'created_at'),  # per-country stats windows
+    )
 
     id = Column(UUID, primary_key=True, index=True)
     hostname = Column(String, index=True)
     country = Column(String)
     city = Column(String, nullable=True)
     weather = Column(String)
-    temperature = Column(String, nullable=True)
-    humidity = Column(String, nullable=True)
-    wind_speed = Column(String, nullable=True)
+    temperature = Column(Float, nullable=True)  # °C
+    humidity = Column(SmallInteger, nullable=True)  # %
+    wind_speed = Column(Float, nullable=True)  # m/s
 
     created_at = Column(DateTime, index=True, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -0,0 +1,63 @@
+"""Production entry point: create the database schema once, then serve the app with uvicorn workers.
+
+    python -m src.server            # create the schema (unless DB_MIGRATIONS_ON_STARTUP=false), then serve
+    python -m src.server migrate    # only create the schema, e.g. as a deploy step
+
+Workers (or this process, with WEB_CONCURRENCY=1) import ``src.main`` and see
+DB_MIGRATIONS_ON_STARTUP=false, so the schema is not created again by their lifespan.
+"""
+import argparse
+import os
+import uvicorn
+
+
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', 8000))
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))  # worker processes
+SERVER_LOOP = os.getenv('SERVER_LOOP', 'uvloop')
+SERVER_HTTP = os.getenv('SERVER_HTTP', 'httptools')
+SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', 2048))  # pending connections queued by the kernel
+SERVER_KEEPALIVE_TIMEOUT = int(os.getenv('SERVER_KEEPALIVE_TIMEOUT', 5))
+# Connections plus tasks per worker before new requests get 503, 0 is unlimited.
+SERVER_LIMIT_CONCURRENCY = int(os.getenv('SERVER_LIMIT_CONCURRENCY', 0))
+# Seconds to finish in-flight requests on shutdown, then the lifespan flushes the background buffers.
+SERVER_GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_SHUTDOWN_TIMEOUT', 30))
+SERVER_FORWARDED_ALLOW_IPS = os.getenv('SERVER_FORWARDED_ALLOW_IPS', '127.0.0.1')  # proxies trusted for client IPs
+SERVER_ACCESS_LOG = os.getenv('SERVER_ACCESS_LOG', 'true').lower() in ('1', 'true', 'yes')
+
+
+def server_options() -> dict:
+    return {
+        'host': SERVER_HOST, 'port': SERVER_PORT, 'workers': max(1, WEB_CONCURRENCY),
+        'loop': SERVER_LOOP, 'http': SERVER_HTTP, 'lifespan': 'on',
+        'backlog': SERVER_BACKLOG, 'timeout_keep_alive': SERVER_KEEPALIVE_TIMEOUT,
+        'limit_concurrency': SERVER_LIMIT_CONCURRENCY or None,
+        'timeout_graceful_shutdown': SERVER_GRACEFUL_SHUTDOWN_TIMEOUT,
+        'proxy_headers': True, 'forwarded_allow_ips': SERVER_FORWARDED_ALLOW_IPS,
+        'access_log': SERVER_ACCESS_LOG,
+    }
+
+
+def migrate():
+    from .databases import database
+    from .schemas import schemas  # noqa: F401, registers the tables on Base.metadata
+
+    database.create_db_when_ready()  # create all database migrations config.
+    database.engine.dispose()  # no pooled connections outlive the parent's setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', choices=['serve', 'migrate'], default='serve')
+    args = parser.parse_args()
+
+    from .databases.database import migrations_on_startup
+    if args.command == 'migrate' or migrations_on_startup():
+        migrate()
+    if args.command == 'serve':
+        os.environ['DB_MIGRATIONS_ON_STARTUP'] = 'false'
+        uvicorn.run('src.main:app', **server_options())
+
+
+if __name__ == '__main__':
+    main()
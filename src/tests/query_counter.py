@@ -0,0 +1,46 @@
+from sqlalchemy import event
+
+from src.databases import database
+
+
+class QueryCounter:
+    """Record what the app sends to the database inside a ``with`` block.
+
+    ``statements`` are the SQL statements, ``transactions`` the begin/commit/rollback events.
+    ``round_trips`` counts statements plus commits and rollbacks; BEGIN is not counted, the
+    drivers send it with the first statement.
+    """
+
+    def __init__(self, engine=None):
+        if engine is None:
+            engine = database.async_engine.sync_engine if database.ASYNC_MODE else database.engine
+        self.engine = engine
+        self.statements: list[str] = []
+        self.transactions: list[str] = []
+        self._listeners = [
+            ('before_cursor_execute', self._record),
+            ('begin', lambda conn: self.transactions.append('begin')),
+            ('commit', lambda conn: self.transactions.append('commit')),
+            ('rollback', lambda conn: self.transactions.append('rollback')),
+        ]
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements, self.transactions = [], []
+        for name, listener in self._listeners:
+            event.listen(self.engine, name, listener)
+        return self
+
+    def __exit__(self, *exc):
+        for name, listener in self._listeners:
+            event.remove(self.engine, name, listener)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def round_trips(self) -> int:
+        return self.count + sum(name != 'begin' for name in self.transactions)
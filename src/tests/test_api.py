@@ -1,10 +1,22 @@
 import unittest
-from fastapi.testclient import TestClient
 import sys
 import os
+import tempfile
 sys.path.append(os.getcwd())
-from main import app
-from databases.database import create_db, drop_db
+
+# Runs against a throwaway SQLite database unless DATABASE_URL is set.
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+from fastapi.testclient import TestClient
+from src.main import app
+from src.databases.database import create_db, drop_db
+
+
+def setUpModule():
+    # Importing the app no longer creates the schema, the lifespan or src.server does.
+    drop_db()
+    create_db()
 
 
 class TestTask(unittest.TestCase):
@@ -0,0 +1,640 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+# Runs against a throwaway SQLite database unless DATABASE_URL is set.
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src.databases import database
+from src.databases.database import create_db, drop_db
+from src.main import app
+from src.routers import internal_router, tasks_router
+from src.tests.query_counter import QueryCounter
+from src.schemas import schemas
+from src.utils import crud, hashing, middleware, oauth2_jwt, request_metrics
+from src.utils.pagination import paginate
+
+
+def setUpModule():
+    drop_db()
+    create_db()
+
+
+def login(client: TestClient, email: str, password: str = 'secret123') -> dict:
+    client.post("/users/me/", json={"name": email.split('@')[0], "email": email, "password": password})
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class TestAuthCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'cache@mail.com')
+
+    def test_token_and_user_are_cached_until_user_update(self):
+        with mock.patch.object(oauth2_jwt.jose_jwt(), 'decode', wraps=oauth2_jwt.jose_jwt().decode) as decode:
+            me = self.client.get("/users/me/", headers=self.headers).json()
+            self.client.get("/users/me/", headers=self.headers)
+        self.assertLessEqual(decode.call_count, 1)
+        self.assertIn('cache@mail.com', oauth2_jwt.user_cache._data)
+
+        self.client.put(f"/api/v1/users/{me['id']}", headers=self.headers, json={"name": "renamed"})
+        self.assertNotIn('cache@mail.com', oauth2_jwt.user_cache._data)
+        self.assertEqual(self.client.get("/users/me/", headers=self.headers).json()['name'], 'renamed')
+
+    def test_me_shows_tasks_written_after_caching(self):
+        me = self.client.get("/users/me/", headers=self.headers).json()
+        self.assertNotIn('tasks', oauth2_jwt.user_cache.get('cache@mail.com').model_dump())
+        self.client.post(f"/api/v1/tasks/users/{me['id']}", headers=self.headers,
+            json={"name": "fresh task", "description": "created after the user was cached"})
+        tasks = self.client.get("/users/me/", headers=self.headers).json()['tasks']
+        self.assertEqual(len(tasks), len(me['tasks']) + 1)
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get("/users/me/", headers={"Authorization": "Bearer not-a-token"})
+        self.assertEqual(response.status_code, 401)
+
+
+class TestPasswordHashing(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        login(self.client, 'hash@mail.com')
+
+    def test_login_is_rejected_when_hash_queue_is_full(self):
+        with mock.patch.object(hashing, 'HASH_MAX_PENDING', 0):
+            response = self.client.post("/token", data={"username": 'hash@mail.com', "password": 'secret123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+        response = self.client.post("/token", data={"username": 'hash@mail.com', "password": 'secret123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(hashing.verify_seconds.count, 0)
+
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'pages@mail.com')
+        me = self.client.get("/users/me/", headers=self.headers).json()
+        self.url = f"/api/v1/tasks/users/{me['id']}"
+        if not self.client.get(self.url, headers=self.headers).json():
+            for i in range(5):
+                self.client.post(self.url, headers=self.headers, json={"name": f"page task {i}", "description": "paginated task"})
+
+    def test_cursor_pages_match_offset_order(self):
+        by_offset = [task['id'] for task in self.client.get(self.url, headers=self.headers, params={"limit": 10}).json()]
+
+        by_cursor, params = [], {"limit": 2}
+        while True:
+            response = self.client.get(self.url, headers=self.headers, params=params)
+            by_cursor += [task['id'] for task in response.json()]
+            if 'X-Next-Cursor' not in response.headers:
+                break
+            params = {"limit": 2, "cursor": response.headers['X-Next-Cursor']}
+
+        self.assertEqual(len(by_offset), 5)
+        self.assertEqual(by_cursor, by_offset)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, headers=self.headers, params={"cursor": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestListSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'serialize@mail.com')
+        me = self.client.get("/users/me/", headers=self.headers).json()
+        self.url = f"/api/v1/tasks/users/{me['id']}"
+        if not self.client.get(self.url, headers=self.headers).json():
+            for i in range(3):
+                self.client.post(self.url, headers=self.headers, json={"name": f"serialized task {i}", "description": "ñandú con paraguas ☂"})
+
+    def test_list_items_match_single_item_responses(self):
+        # Single-item routes still go through FastAPI's response_model path.
+        response = self.client.get("/api/v1/users/", headers=self.headers, params={"limit": 100})
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        for user in response.json():
+            self.assertNotIn('hashed_password', user)
+            self.assertEqual(user, self.client.get(f"/api/v1/users/{user['id']}", headers=self.headers).json())
+            for task in user['tasks']:
+                self.assertEqual(task, self.client.get(f"/api/v1/tasks/{task['id']}", headers=self.headers).json())
+
+    def test_next_cursor_header_is_kept(self):
+        response = self.client.get(self.url, headers=self.headers, params={"limit": 2})
+        self.assertEqual(len(response.json()), 2)
+        self.assertIn('X-Next-Cursor', response.headers)
+        self.assertEqual(response.headers['content-length'], str(len(response.content)))
+
+
+class TestInternalRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'internal@mail.com')
+
+    def test_hidden_without_a_configured_token(self):
+        self.assertEqual(self.client.get("/internal/pool", headers=self.headers).status_code, 404)
+
+    def test_user_jwt_is_not_enough(self):
+        with mock.patch.object(internal_router, 'INTERNAL_TOKEN', 'operator-secret'):
+            self.assertEqual(self.client.get("/internal/pool", headers=self.headers).status_code, 403)
+            self.assertEqual(self.client.get("/internal/pool", headers={"X-Internal-Token": "guess"}).status_code, 403)
+            response = self.client.get("/internal/cache", headers={"X-Internal-Token": "operator-secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('read_cache', response.json())
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'metrics@mail.com')
+
+    def test_routes_are_labelled_by_template(self):
+        task = self.client.post("/api/v1/tasks/", headers=self.headers, json={"name": "metered", "description": "metered task"}).json()
+        self.client.get(f"/api/v1/tasks/{task['id']}", headers=self.headers)
+        self.client.get("/no/such/path")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/v1/tasks/{id}",status="200"}', response.text)
+        self.assertIn('route="unmatched",status="404"', response.text)
+        self.assertNotIn(task['id'], response.text)
+        queries = [line for line in response.text.splitlines() if line.startswith('http_request_db_queries_total{method="POST",route="/api/v1/tasks/"}')]
+        self.assertGreater(int(queries[0].split()[-1]), 0)
+
+    def test_server_timing_header(self):
+        self.assertNotIn('server-timing', self.client.get("/users/me/", headers=self.headers).headers)
+        with mock.patch.object(request_metrics, 'SERVER_TIMING', True):
+            response = self.client.get("/users/me/", headers=self.headers)
+        self.assertRegex(response.headers['server-timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"')
+
+
+class TestQueryCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'queries@mail.com')
+        for i in range(5):
+            email = f'member{i}@mail.com'
+            response = self.client.post("/api/v1/users/", headers=self.headers, json={"name": "member", "email": email, "password": "secret123"})
+            if response.status_code == 200:
+                self.client.post(f"/api/v1/tasks/users/{response.json()['id']}", headers=self.headers,
+                    json={"name": "member task", "description": "member task description"})
+        self.client.get("/users/me/", headers=self.headers)  # warm the auth caches
+
+    def count(self, url: str, **params) -> int:
+        with QueryCounter() as counter:
+            self.assertEqual(self.client.get(url, headers=self.headers, params=params).status_code, 200)
+        return counter.count
+
+    def test_user_list_statements_do_not_grow_with_page_size(self):
+        self.assertEqual(self.count("/api/v1/users/", limit=1), 2)  # users + their tasks
+        self.assertEqual(self.count("/api/v1/users/", limit=6), 2)
+        self.assertEqual(self.count("/api/v1/users/", limit=6, include_tasks=False), 1)
+
+    def test_me_is_served_from_cache(self):
+        with QueryCounter() as counter:
+            self.client.get("/users/me/", headers=self.headers)
+        self.assertEqual(counter.round_trips, 0)
+        response = self.client.get("/users/me/", headers=self.headers, params={"include_tasks": False})
+        self.assertEqual(response.json()['tasks'], [])
+
+    def test_principal_lookup_does_not_load_tasks(self):
+        oauth2_jwt.user_cache.clear()
+        with QueryCounter() as counter:
+            response = self.client.get("/users/me/", headers=self.headers, params={"include_tasks": False})
+        self.assertEqual(response.json()['tasks'], [])
+        self.assertEqual([statement for statement in counter.statements if 'FROM tasks' in statement], [])
+
+
+class TestRoundTrips(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'writes@mail.com')
+        self.client.get("/users/me/", headers=self.headers)  # warm the auth caches
+        response = self.client.post("/api/v1/users/", headers=self.headers,
+            json={"name": "writer", "email": f"{uuid.uuid4()}@mail.com", "password": "secret123"})
+        self.user = response.json()['id']
+        response = self.client.post(f"/api/v1/tasks/users/{self.user}", headers=self.headers,
+            json={"name": "writer task", "description": "writer task description"})
+        self.task = response.json()['id']
+
+    def round_trips(self, method: str, url: str, **kwargs) -> int:
+        with QueryCounter() as counter:
+            response = self.client.request(method, url, headers=self.headers, **kwargs)
+        self.assertLess(response.status_code, 300)
+        return counter.round_trips
+
+    def test_task_writes_take_one_statement_and_commit(self):
+        self.assertEqual(self.round_trips("PUT", f"/api/v1/tasks/{self.task}", json={"status": "finished"}), 2)
+        self.assertEqual(self.client.get(f"/api/v1/tasks/{self.task}", headers=self.headers).json()['status'], 'finished')
+        self.assertEqual(self.round_trips("DELETE", f"/api/v1/tasks/{self.task}"), 2)
+        self.assertEqual(self.client.put(f"/api/v1/tasks/{self.task}", headers=self.headers, json={"status": "finished"}).status_code, 404)
+
+    def test_user_writes_do_not_load_tasks_to_cascade(self):
+        # The update returns the user's tasks, which are loaded with one IN query; one commit each.
+        self.assertEqual(self.round_trips("PUT", f"/api/v1/users/{self.user}", json={"name": "renamed"}), 3)
+        self.assertEqual(self.round_trips("DELETE", f"/api/v1/users/{self.user}"), 2)
+        self.assertEqual(self.client.get(f"/api/v1/tasks/{self.task}", headers=self.headers).status_code, 404)
+
+
+class TestConditionalRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'etag@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+        task = self.client.post(f"/api/v1/tasks/users/{self.owner}", headers=self.headers,
+            json={"name": "polled task", "description": "fetched over and over"}).json()
+        self.url = f"/api/v1/tasks/{task['id']}"
+
+    def get(self, url: str, etag: str | None = None, **params):
+        headers = {**self.headers, **({"If-None-Match": etag} if etag else {})}
+        return self.client.get(url, headers=headers, params=params)
+
+    def test_if_none_match_returns_304_until_the_task_changes(self):
+        etag = self.get(self.url).headers['ETag']
+        response = self.get(self.url, etag)
+        self.assertEqual((response.status_code, response.content, response.headers['ETag']), (304, b'', etag))
+        self.assertEqual(self.get(self.url, f'W/{etag}, "other"').status_code, 304)
+
+        self.client.put(self.url, headers=self.headers, json={"status": "in-progress"})
+        response = self.get(self.url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_user_etag_follows_embedded_tasks(self):
+        url = f"/api/v1/users/{self.owner}"
+        etag = self.get(url).headers['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        self.assertNotEqual(self.get(url, include_tasks=False).headers['ETag'], etag)
+        self.client.put(self.url, headers=self.headers, json={"name": "renamed polled task"})
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+    def test_if_match_prevents_lost_updates(self):
+        etag = self.get(self.url).headers['ETag']
+        first = self.client.put(self.url, headers={**self.headers, "If-Match": etag}, json={"name": "first writer"})
+        self.assertEqual(first.status_code, 200)
+        second = self.client.put(self.url, headers={**self.headers, "If-Match": etag}, json={"name": "second writer"})
+        self.assertEqual(second.status_code, 412)
+        self.assertEqual(self.get(self.url).json()['name'], "first writer")
+
+        retry = self.client.put(self.url, headers={**self.headers, "If-Match": first.headers['ETag']}, json={"name": "second writer"})
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(self.client.put(self.url, headers={**self.headers, "If-Match": '"garbage"'}, json={"name": "x" * 5}).status_code, 412)
+        missing = f"/api/v1/tasks/{uuid.uuid4()}"
+        self.assertEqual(self.client.put(missing, headers={**self.headers, "If-Match": "*"}, json={"name": "nobody"}).status_code, 404)
+
+    def test_if_match_on_users(self):
+        response = self.client.post("/api/v1/users/", headers=self.headers,
+            json={"name": "versioned", "email": f"{uuid.uuid4()}@mail.com", "password": "secret123"})
+        url = f"/api/v1/users/{response.json()['id']}"
+        etag = self.get(url).headers['ETag']
+        self.assertEqual(self.client.put(url, headers={**self.headers, "If-Match": etag}, json={"name": "one"}).status_code, 200)
+        self.assertEqual(self.client.put(url, headers={**self.headers, "If-Match": etag}, json={"name": "two"}).status_code, 412)
+
+
+class TestReadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'reads@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+        task = self.client.post(f"/api/v1/tasks/users/{self.owner}", headers=self.headers,
+            json={"name": "cached task", "description": "read again and again"}).json()
+        self.url = f"/api/v1/tasks/{task['id']}"
+
+    def round_trips(self, url: str, **params) -> tuple[int, dict | list]:
+        with QueryCounter() as counter:
+            response = self.client.get(url, headers=self.headers, params=params)
+        return counter.round_trips, response.json()
+
+    def test_task_reads_are_cached_until_written(self):
+        self.round_trips(self.url)
+        count, task = self.round_trips(self.url)
+        self.assertEqual((count, task['name']), (0, "cached task"))
+
+        self.client.put(self.url, headers=self.headers, json={"name": "changed task"})
+        self.assertEqual(self.round_trips(self.url)[1]['name'], "changed task")
+        self.client.delete(self.url, headers=self.headers)
+        self.assertEqual(self.client.get(self.url, headers=self.headers).status_code, 404)
+
+    def test_user_and_first_page_follow_task_writes(self):
+        user_url = f"/api/v1/users/{self.owner}"
+        tasks = len(self.round_trips(user_url)[1]['tasks'])
+        self.assertEqual(self.round_trips(user_url)[0], 0)
+        self.round_trips("/api/v1/tasks/", limit=100)
+        self.assertEqual(self.round_trips("/api/v1/tasks/", limit=100)[0], 0)
+
+        self.client.post(f"/api/v1/tasks/users/{self.owner}", headers=self.headers,
+            json={"name": "another cached task", "description": "read again and again"})
+        self.assertEqual(len(self.round_trips(user_url)[1]['tasks']), tasks + 1)
+        self.assertIn("another cached task", [task['name'] for task in self.round_trips("/api/v1/tasks/", limit=100)[1]])
+
+
+class TestBulkTasks(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'bulk@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+
+    def statements(self, counter: QueryCounter, verb: str) -> int:
+        return sum(statement.lstrip().upper().startswith(verb) for statement in counter.statements)
+
+    def test_create_update_delete_in_one_statement_each(self):
+        tasks = [{"name": f"bulk task {i}", "description": "bulk task description", "owner_id": self.owner} for i in range(3)]
+        tasks.append({"name": "orphan task", "description": "bulk task description", "owner_id": str(uuid.uuid4())})
+        with QueryCounter() as counter:
+            created = self.client.post("/api/v1/tasks/bulk", headers=self.headers, json=tasks).json()
+        self.assertEqual([item['status'] for item in created], [201, 201, 201, 404])
+        self.assertEqual(self.statements(counter, 'INSERT'), 1)
+        ids = [item['id'] for item in created[:3]]
+
+        changes = [{"id": ids[0], "status": "finished"}, {"id": ids[1], "name": "renamed bulk task"}, {"id": str(uuid.uuid4()), "name": "missing"}]
+        with QueryCounter() as counter:
+            updated = self.client.patch("/api/v1/tasks/bulk", headers=self.headers, json=changes).json()
+        self.assertEqual([item['status'] for item in updated], [200, 200, 404])
+        self.assertEqual(self.statements(counter, 'UPDATE'), 1)
+        self.assertEqual((updated[0]['task']['status'], updated[0]['task']['name']), ('finished', 'bulk task 0'))
+        self.assertEqual(updated[1]['task']['name'], 'renamed bulk task')
+
+        missing = str(uuid.uuid4())
+        deleted = self.client.request("DELETE", "/api/v1/tasks/bulk", headers=self.headers, json=ids + [missing]).json()
+        self.assertEqual([item['status'] for item in deleted], [204, 204, 204, 404])
+        self.assertEqual(self.client.get(f"/api/v1/tasks/{ids[0]}", headers=self.headers).status_code, 404)
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.post("/api/v1/tasks/bulk", headers=self.headers, json=[])
+        self.assertEqual(response.status_code, 422)
+
+    def test_ndjson_upload(self):
+        lines = [
+            json.dumps({"name": "ndjson task 0", "description": "streamed task description"}),
+            '{"name": "bad"}',
+            "",
+            json.dumps({"name": "ndjson task 1", "description": "streamed task description", "owner_id": self.owner}),
+        ]
+        response = self.client.post("/api/v1/tasks/bulk/ndjson", headers=self.headers, content="\n".join(lines))
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([(item['index'], item['status']) for item in results], [(0, 201), (1, 422), (2, 201)])
+        self.assertEqual(results[2]['task']['owner_id'], self.owner)
+
+    def test_ndjson_upload_is_answered_per_chunk_in_order(self):
+        lines = [json.dumps({"name": f"chunked task {i}", "description": "streamed task description"}) for i in range(5)]
+        lines[3] = '{"name": "bad"}'
+        with mock.patch('src.routers.tasks_router.BULK_MAX_ITEMS', 2):
+            response = self.client.post("/api/v1/tasks/bulk/ndjson", headers=self.headers, content="\n".join(lines))
+            chunks = asyncio.run(self.collect(tasks_router.stream_ndjson_results(mock.Mock(stream=lambda: self.body(lines)))))
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([(item['index'], item['status']) for item in results], [(0, 201), (1, 201), (2, 201), (3, 422), (4, 201)])
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [2, 2, 1])  # one response chunk per insert
+
+    @staticmethod
+    async def body(lines: list[str]):
+        for line in lines:
+            yield line.encode() + b'\n'
+
+    @staticmethod
+    async def collect(chunks) -> list[str]:
+        return [chunk async for chunk in chunks]
+
+
+class TestBulkUpdateOnAsyncDriver(unittest.IsolatedAsyncioTestCase):
+    # The bulk UPDATE on an async driver, whatever mode the suite runs in. asyncpg infers
+    # untyped parameters from the query, set ASYNC_TEST_DATABASE_URL to run it there.
+
+    async def asyncSetUp(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        self.engine = create_async_engine(os.getenv(
+            'ASYNC_TEST_DATABASE_URL', f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}"))
+        async with self.engine.begin() as connection:
+            await connection.run_sync(database.Base.metadata.create_all)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_bulk_update_binds_typed_values(self):
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from src.models import models
+
+        async with AsyncSession(self.engine, expire_on_commit=False) as db:
+            tasks = [schemas.Task(id=uuid.uuid4(), name=f"async task {i}", description="async bulk task", status="pending")
+                     for i in range(2)]
+            db.add_all(tasks)
+            await db.commit()
+        async with AsyncSession(self.engine, expire_on_commit=False) as db:
+            changes = [models.TaskBulkUpdate(id=tasks[0].id, status=models.StatusEnum.FINISHED),
+                       models.TaskBulkUpdate(id=tasks[1].id, name="renamed async task", description="renamed on the async driver")]
+            updated = await db.run_sync(crud.update_tasks, tasks=changes)
+        self.assertEqual([(task.name, task.status) for task in updated],
+                         [("async task 0", "finished"), ("renamed async task", "pending")])
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'export@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+        self.url = f"/api/v1/tasks/users/{self.owner}"
+        if not self.client.get(self.url, headers=self.headers).json():
+            for i in range(3):
+                self.client.post(self.url, headers=self.headers, json={"name": f"export task {i}", "description": "exported task", "status": "finished" if i else "pending"})
+
+    def test_ndjson_export_is_filtered_and_ordered(self):
+        with mock.patch('src.utils.export.EXPORT_BATCH_SIZE', 2):
+            response = self.client.get("/api/v1/tasks/export", headers=self.headers, params={"owner_id": self.owner})
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row['name'] for row in rows], [f"export task {i}" for i in range(3)])
+
+        response = self.client.get("/api/v1/tasks/export", headers=self.headers, params={"owner_id": self.owner, "status": "finished"})
+        self.assertEqual(len(response.text.splitlines()), 2)
+
+    def test_csv_export(self):
+        response = self.client.get("/api/v1/tasks/export", headers=self.headers, params={"owner_id": self.owner, "format": "csv"})
+        self.assertTrue(response.headers['content-type'].startswith('text/csv'))
+        self.assertIn('filename="tasks.csv"', response.headers['content-disposition'])
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0].split(','), ['id', 'name', 'description', 'status', 'owner_id', 'created_at', 'updated_at'])
+        self.assertEqual(len(lines), 4)
+
+    def test_weather_export_without_rows_is_empty(self):
+        response = self.client.get("/api/v1/weather/export", headers=self.headers, params={"country": "Nowhere"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, '')
+
+
+class TestTaskFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'filters@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+        url = f"/api/v1/tasks/users/{self.owner}"
+        if not self.client.get(url, headers=self.headers).json():
+            for name, task_status in [("alpha_1 task", "pending"), ("alpha_2 task", "finished"), ("beta task", "finished")]:
+                self.client.post(url, headers=self.headers, json={"name": name, "description": "filtered task", "status": task_status})
+
+    def names(self, **params) -> list[str]:
+        response = self.client.get("/api/v1/tasks/", headers=self.headers, params={"owner_id": self.owner, **params})
+        self.assertEqual(response.status_code, 200)
+        return [task['name'] for task in response.json()]
+
+    def test_filters_and_sort(self):
+        self.assertEqual(self.names(), ["alpha_1 task", "alpha_2 task", "beta task"])
+        self.assertEqual(self.names(status="finished"), ["alpha_2 task", "beta task"])
+        self.assertEqual(self.names(name_prefix="alpha_"), ["alpha_1 task", "alpha_2 task"])
+        self.assertEqual(self.names(name_prefix="alpha%"), [])
+        self.assertEqual(self.names(sort="-name"), ["beta task", "alpha_2 task", "alpha_1 task"])
+        self.assertEqual(self.names(created_before="2000-01-01T00:00:00"), [])
+
+    def test_unknown_sort_and_cursor_with_sort_are_rejected(self):
+        self.assertEqual(self.client.get("/api/v1/tasks/", headers=self.headers, params={"sort": "hashed_password"}).status_code, 422)
+        response = self.client.get("/api/v1/tasks/", headers=self.headers, params={"limit": 1})
+        params = {"sort": "name", "cursor": response.headers['X-Next-Cursor']}
+        self.assertEqual(self.client.get("/api/v1/tasks/", headers=self.headers, params=params).status_code, 400)
+
+
+class TestTaskSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'search@mail.com')
+        self.url = url = f"/api/v1/tasks/users/{self.client.get('/users/me/', headers=self.headers).json()['id']}"
+        if not self.client.get(url, headers=self.headers).json():
+            self.client.post(url, headers=self.headers, json={"name": "quarterly report", "description": "collect the invoices of the zebra account"})
+            self.client.post(url, headers=self.headers, json={"name": "zebra zebra crossing", "description": "paint the zebra crossing white"})
+            self.client.post(url, headers=self.headers, json={"name": "groceries", "description": "buy milk and bread"})
+
+    def search(self, q: str) -> list[str]:
+        response = self.client.get("/api/v1/tasks/search", headers=self.headers, params={"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [task['name'] for task in response.json()]
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.search("zebra"), ["zebra zebra crossing", "quarterly report"])
+        self.assertEqual(self.search("milk bread"), ["groceries"])
+        self.assertEqual(self.search('"milk" OR NEAR('), [])  # query syntax is not interpreted
+
+    def test_common_term_ranks_every_match(self):
+        owner = self.client.get('/users/me/', headers=self.headers).json()['id']
+        with database.SessionLocal() as db:
+            db.add_all(schemas.Task(id=uuid.uuid4(), name=f"walrus filler {i}", description="feed the walrus", owner_id=uuid.UUID(owner))
+                       for i in range(1200))
+            db.add(schemas.Task(id=uuid.uuid4(), name="walrus walrus", description="walrus walrus walrus", owner_id=uuid.UUID(owner)))
+            db.commit()
+        self.assertEqual(self.search("walrus")[0], "walrus walrus")
+        response = self.client.get("/api/v1/tasks/search", headers=self.headers, params={"q": "walrus", "offset": 1195})
+        self.assertEqual(len(response.json()), 6)
+
+    def test_index_follows_updates_and_deletes(self):
+        task = self.client.post(self.url, headers=self.headers, json={"name": "laundry", "description": "wash the towels"}).json()
+        self.assertEqual(self.search("laundry"), ["laundry"])
+        self.client.put(f"/api/v1/tasks/{task['id']}", headers=self.headers, json={"name": "shopping"})
+        self.assertEqual(self.search("laundry"), [])
+        self.assertEqual(self.search("shopping"), ["shopping"])
+        self.client.delete(f"/api/v1/tasks/{task['id']}", headers=self.headers)
+        self.assertEqual(self.search("shopping"), [])
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.headers = login(self.client, 'stats@mail.com')
+        self.owner = self.client.get("/users/me/", headers=self.headers).json()['id']
+        self.url = f"/api/v1/tasks/users/{self.owner}"
+
+    def counts(self, **params) -> dict:
+        response = self.client.get("/api/v1/tasks/stats", headers=self.headers, params={"owner_id": self.owner, **params})
+        self.assertEqual(response.status_code, 200)
+        return {row['status']: row['count'] for row in response.json()}
+
+    def test_task_counts_are_cached_until_a_task_write(self):
+        before = self.counts()
+        with QueryCounter() as counter:
+            self.assertEqual(self.counts(), before)
+        self.assertEqual(counter.round_trips, 0)
+
+        task = self.client.post(self.url, headers=self.headers, json={"name": "counted task", "description": "counted by the stats"}).json()
+        self.assertEqual(self.counts().get('pending', 0), before.get('pending', 0) + 1)
+        self.client.put(f"/api/v1/tasks/{task['id']}", headers=self.headers, json={"status": "finished"})
+        self.assertEqual(self.counts().get('finished', 0), before.get('finished', 0) + 1)
+
+        rows = self.client.get("/api/v1/tasks/stats", headers=self.headers, params={"owner_id": self.owner, "by_day": True}).json()
+        self.assertTrue(all(row['day'] for row in rows))
+
+    def test_weather_aggregates_per_country(self):
+        weather = {"hostname": "stats-host", "city": "Lima", "weather": "Clouds", "humidity": 80, "wind_speed": 3.5}
+        with database.SessionLocal() as db:
+            crud.create_weathers(db, [
+                {**weather, "country": "Statsland", "temperature": 10.0},
+                {**weather, "country": "Statsland", "temperature": 20.0},
+                {**weather, "country": "Otherland", "temperature": 30.0},
+            ])
+        response = self.client.get("/api/v1/weather/stats", headers=self.headers, params={"country": "Statsland"})
+        self.assertEqual(response.json(), [{
+            "country": "Statsland", "city": None, "requests": 2, "avg_temperature": 15.0, "min_temperature": 10.0,
+            "max_temperature": 20.0, "avg_humidity": 80.0, "avg_wind_speed": 3.5,
+        }])
+        response = self.client.get("/api/v1/weather/stats", headers=self.headers, params={"country": "Statsland", "by_city": True})
+        self.assertEqual(response.json()[0]['city'], "Lima")
+
+    def test_retention_purges_only_old_weather_rows(self):
+        weather = {"hostname": "old-host", "country": "Purgeland", "city": None, "weather": "Rain", "temperature": 5.5, "humidity": 90, "wind_speed": 1.0}
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with database.SessionLocal() as db:
+            crud.create_weathers(db, [{**weather, "created_at": now - timedelta(days=days)} for days in (40, 35, 1)])
+        with mock.patch.object(middleware, 'WEATHER_RETENTION_BATCH_SIZE', 1):
+            self.assertEqual(middleware.purge_weathers(now - timedelta(days=30)), 2)
+        response = self.client.get("/api/v1/weather/stats", headers=self.headers, params={"country": "Purgeland"})
+        self.assertEqual(response.json()[0]['requests'], 1)
+
+
+class TestDatabaseClock(unittest.TestCase):
+
+    def test_created_at_defaults_are_naive_utc(self):
+        # Retention cutoffs and created_after filters compare naive UTC with the func.now() defaults.
+        client = TestClient(app)
+        headers = login(client, 'clock@mail.com')
+        task = client.post("/api/v1/tasks/", headers=headers, json={"name": "clock task", "description": "created now"}).json()
+        utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.assertLess(abs((datetime.fromisoformat(task['created_at']) - utc).total_seconds()), 60)
+
+
+@unittest.skipUnless(database.engine.dialect.name == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class TestTaskQueryPlans(unittest.TestCase):
+
+    def plan(self, **filters) -> str:
+        with database.SessionLocal() as db:
+            query = paginate(db.query(schemas.Task).filter(*crud.task_filters(**filters)), schemas.Task, limit=10)
+            sql = query.statement.compile(dialect=database.engine.dialect, compile_kwargs={'literal_binds': True})
+            return ' '.join(row[-1] for row in db.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+    def test_owner_and_status_filters_use_composite_indexes(self):
+        self.assertIn('USING INDEX ix_tasks_owner_id_created_at_id', self.plan(owner_id=uuid.uuid4()))
+        self.assertIn('USING INDEX ix_tasks_status_created_at_id', self.plan(status='finished'))
+        self.assertNotIn('USE TEMP B-TREE', self.plan(owner_id=uuid.uuid4()))  # index order, no sort step
+
+
+if __name__ == '__main__':
+    unittest.main()
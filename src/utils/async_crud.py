@@ -0,0 +1,164 @@
+### Async CRUD: awaitable versions of utils.crud for both sync and async sessions.
+# With an AsyncSession the sync CRUD code runs on the async driver (asyncpg/aiosqlite)
+# through AsyncSession.run_sync, otherwise it runs in the threadpool.
+from ..databases.database import DBSession, run_sync
+from ..models import models
+from ..utils import crud, hashing
+from ..utils.read_cache import model_codec, read_cache
+
+
+### Read cache keys. User entries with tasks and the first task pages depend on every
+# task, so they carry the "tasks" generation that task writes bump. Task entries carry the
+# "owners" generation, bumped when a user and their tasks are deleted by the cascade.
+TASK, USER, TASKS = model_codec(models.Task), model_codec(models.User), model_codec(list[models.Task])
+
+
+async def task_key(task_id) -> str | None:
+    return await read_cache.versioned_key(f'task:{task_id}', 'owners')
+
+
+async def user_key(user_id, include_tasks: bool) -> str | None:
+    if include_tasks:
+        return await read_cache.versioned_key(f'user:{user_id}:tasks', 'tasks')
+    return f'user:{user_id}'
+
+
+async def forget_tasks(*task_ids):
+    keys = [await task_key(task_id) for task_id in task_ids]
+    await read_cache.invalidate(*filter(None, keys))
+    await read_cache.bump('tasks')
+
+
+async def forget_user(user_id, with_tasks: bool = False):
+    await read_cache.invalidate(*filter(None, [await user_key(user_id, False), await user_key(user_id, True)]))
+    if with_tasks:
+        await read_cache.bump('tasks', 'owners')
+
+
+def _with_tasks(fn):
+    # Load User.tasks of a new user inside the sync context: an async session cannot lazy
+    # load later, while the response is serialized on the event loop. Reads use selectinload.
+    def load(db, *args, **kwargs):
+        result = fn(db, *args, **kwargs)
+        if result is not None:
+            result.tasks
+        return result
+    return load
+
+
+async def get_user(db: DBSession, user_id: str, include_tasks: bool = True):
+    return await read_cache.get_or_load(
+        await user_key(user_id, include_tasks),
+        lambda: run_sync(db, crud.get_user, user_id=user_id, include_tasks=include_tasks), *USER)
+
+
+async def get_user_by_email(db: DBSession, email: str, include_tasks: bool = True):
+    return await run_sync(db, crud.get_user_by_email, email=email, include_tasks=include_tasks)
+
+
+async def get_users(db: DBSession, offset: int = 0, limit: int = 10, after: tuple | None = None, include_tasks: bool = True):
+    return await run_sync(db, crud.get_users, offset=offset, limit=limit, after=after, include_tasks=include_tasks)
+
+
+async def create_user(db: DBSession, user: models.UserCreate):
+    hashed_password = await hashing.hash_password(user.password)  # bcrypt runs off the event loop
+    return await run_sync(db, _with_tasks(crud.create_user), user=user, hashed_password=hashed_password)
+
+
+async def update_user(db: DBSession, user_id: str, user: models.UserUpdate, versions: list | None = None):
+    hashed_password = await hashing.hash_password(user.password) if user.password is not None else None
+    db_user = await run_sync(db, crud.update_user, user_id=user_id, user=user, hashed_password=hashed_password, versions=versions)
+    if db_user is not None:
+        await forget_user(user_id)
+    return db_user
+
+
+async def delete_user(db: DBSession, user_id: str):
+    if deleted := await run_sync(db, crud.delete_user, user_id=user_id):
+        await forget_user(user_id, with_tasks=True)
+    return deleted
+
+
+async def get_tasks(db: DBSession, offset: int = 0, limit: int = 100, after: tuple | None = None,
+                    filters: dict | None = None, sort: str = 'created_at'):
+    def load():
+        return run_sync(db, crud.get_tasks, offset=offset, limit=limit, after=after, filters=filters, sort=sort)
+
+    # Only the unfiltered first page is cached, deeper pages are rarely read twice.
+    if offset or after is not None or sort != 'created_at' or any(value is not None for value in (filters or {}).values()):
+        return await load()
+    return await read_cache.get_or_load(await read_cache.versioned_key(f'tasks:first:{limit}', 'tasks'), load, *TASKS)
+
+
+async def search_tasks(db: DBSession, q: str, offset: int = 0, limit: int = 10):
+    return await run_sync(db, crud.search_tasks, q=q, offset=offset, limit=limit)
+
+
+async def get_task(db: DBSession, task_id: str):
+    return await read_cache.get_or_load(await task_key(task_id), lambda: run_sync(db, crud.get_task, task_id=task_id), *TASK)
+
+
+async def create_task(db: DBSession, task: models.TaskCreate):
+    db_task = await run_sync(db, crud.create_task, task=task)
+    await forget_tasks()
+    return db_task
+
+
+async def create_user_task(db: DBSession, task: models.TaskCreate, user_id: str):
+    if db_task := await run_sync(db, crud.create_user_task, task=task, user_id=user_id):
+        await forget_tasks()
+    return db_task
+
+
+async def get_user_tasks(db: DBSession, user_id: str, offset: int = 0, limit: int = 100, after: tuple | None = None):
+    return await run_sync(db, crud.get_user_tasks, user_id=user_id, offset=offset, limit=limit, after=after)
+
+
+async def update_task(db: DBSession, task_id: str, task: models.TaskUpdate, versions: list | None = None):
+    if db_task := await run_sync(db, crud.update_task, task_id=task_id, task=task, versions=versions):
+        await forget_tasks(task_id)
+    return db_task
+
+
+async def delete_task(db: DBSession, task_id: str):
+    if deleted := await run_sync(db, crud.delete_task, task_id=task_id):
+        await forget_tasks(task_id)
+    return deleted
+
+
+async def task_stats(db: DBSession, filters: dict | None = None, by_day: bool = False):
+    return await run_sync(db, crud.task_stats, filters=filters, by_day=by_day)
+
+
+async def create_tasks(db: DBSession, tasks: list[models.TaskBulkCreate]):
+    created = await run_sync(db, crud.create_tasks, tasks=tasks)
+    await forget_tasks()
+    return created
+
+
+async def update_tasks(db: DBSession, tasks: list[models.TaskBulkUpdate]):
+    updated = await run_sync(db, crud.update_tasks, tasks=tasks)
+    await forget_tasks(*{db_task.id for db_task in updated if db_task is not None})
+    return updated
+
+
+async def delete_tasks(db: DBSession, task_ids: list):
+    deleted = await run_sync(db, crud.delete_tasks, task_ids=task_ids)
+    await forget_tasks(*{task_id for task_id, found in zip(task_ids, deleted) if found})
+    return deleted
+
+
+async def create_weather(db: DBSession, weather: dict):
+    return await run_sync(db, crud.create_weather, weather=weather)
+
+
+async def create_weathers(db: DBSession, weathers: list[dict]):
+    return await run_sync(db, crud.create_weathers, weathers=weathers)
+
+
+async def get_weathers(db: DBSession, offset: int = 0, limit: int = 100, after: tuple | None = None):
+    return await run_sync(db, crud.get_weathers, offset=offset, limit=limit, after=after)
+
+
+async def weather_stats(db: DBSession, country=None, created_after=None, created_before=None, by_city: bool = False):
+    return await run_sync(db, crud.weather_stats, country=country, created_after=created_after, created_before=created_before, by_city=by_city)
@@ -0,0 +1,119 @@
+### In-process TTL + LRU cache with negative caching and single-flight loading.
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after a per-entry TTL.
+
+    ``None`` values are cached too (negative caching) using ``negative_ttl``, so
+    failed lookups are not retried on every call. ``get_or_load`` coalesces
+    concurrent loads of the same key into a single call of the loader.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, negative_ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: dict = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.load_errors = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl: float | None = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for ``key`` or await ``loader()`` once for all concurrent callers.
+
+        Loader exceptions are logged and cached as a negative (``None``) result.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        if (future := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            try:
+                value = await loader()
+            except Exception:
+                self.load_errors += 1
+                logger.warning('Cache load failed for %r', key, exc_info=True)
+                value = None
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException:  # cancelled leader: release the waiters instead of hanging them
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'coalesced': self.coalesced,
+            'load_errors': self.load_errors,
+        }
@@ -1,25 +1,36 @@
 from uuid import uuid4
-from sqlalchemy.orm import Session
+from sqlalchemy import case, cast, delete, func, insert, literal, literal_column, select, table, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session, noload, selectinload
 
+from ..databases.search import SEARCH_LANGUAGE, fts5_query
 from ..models import models
 from ..schemas import schemas
-from ..utils import oauth2_jwt
+from ..utils import oauth2_jwt, stats
+from ..utils.pagination import paginate
 
 
-def get_user(db: Session, user_id: str):
-    return db.query(schemas.User).filter(schemas.User.id == user_id).first()
+def query_users(db: Session, include_tasks: bool = True):
+    # User.tasks is loaded for all users with one extra IN query, or not at all (empty list).
+    loader = selectinload(schemas.User.tasks) if include_tasks else noload(schemas.User.tasks)
+    return db.query(schemas.User).options(loader)
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(schemas.User).filter(schemas.User.email == email).first()
+def get_user(db: Session, user_id: str, include_tasks: bool = True):
+    return query_users(db, include_tasks).filter(schemas.User.id == user_id).first()
 
 
-def get_users(db: Session, offset: int = 0, limit: int = 10):
-    return db.query(schemas.User).offset(offset).limit(limit).all()
+def get_user_by_email(db: Session, email: str, include_tasks: bool = True):
+    return query_users(db, include_tasks).filter(schemas.User.email == email).first()
 
 
-def create_user(db: Session, user: models.UserCreate):
-    hashed_password = oauth2_jwt.get_password_hash(user.password)
+def get_users(db: Session, offset: int = 0, limit: int = 10, after: tuple | None = None, include_tasks: bool = True):
+    return paginate(query_users(db, include_tasks), schemas.User, offset=offset, limit=limit, after=after).all()
+
+
+def create_user(db: Session, user: models.UserCreate, hashed_password: str | None = None):
+    if hashed_password is None:
+        hashed_password = oauth2_jwt.get_password_hash(user.password)
     db_user = schemas.User(
         id=uuid4(), name=user.name, email=user.email,
         hashed_password=hashed_password
@@ -30,31 +41,72 @@ def create_user(db: Session, user: models.UserCreate):
     return db_user
 
 
-def update_user(db: Session, user_id: str, user: models.UserUpdate):
-    if db_user := db.query(schemas.User).filter(schemas.User.id == user_id).first():
-        if user.name is not None:
-            db_user.name = user.name
-        if user.is_active is not None:
-            db_user.is_active = user.is_active
-        if user.password is not None:
-            db_user.hashed_password = oauth2_jwt.get_password_hash(user.password)
-        
+def update_user(db: Session, user_id: str, user: models.UserUpdate, hashed_password: str | None = None,
+                versions: list | None = None):
+    # One UPDATE ... RETURNING instead of SELECT, flush and refresh; tasks follow with one IN query.
+    # With ``versions`` (If-Match) only a user whose updated_at is one of them is updated.
+    values = {}
+    if user.name is not None:
+        values['name'] = user.name
+    if user.is_active is not None:
+        values['is_active'] = user.is_active
+    if hashed_password is not None:
+        values['hashed_password'] = hashed_password
+    elif user.password is not None:
+        values['hashed_password'] = oauth2_jwt.get_password_hash(user.password)
+
+    if not values:
+        db_user = get_user(db, user_id)
+        return db_user if db_user and (versions is None or db_user.updated_at in versions) else None
+    statement = update(schemas.User).where(schemas.User.id == user_id).values(**values) \
+        .returning(schemas.User).options(selectinload(schemas.User.tasks)).execution_options(synchronize_session=False)
+    if versions is not None:
+        statement = statement.where(schemas.User.updated_at.in_(versions))
+    if db_user := db.scalars(statement).first():
         db.commit()
-        db.refresh(db_user)
+        oauth2_jwt.invalidate_user(db_user.email)
         return db_user
     return None
 
 
 def delete_user(db: Session, user_id: str):
-    if db_user := db.query(schemas.User).filter(schemas.User.id == user_id).first():
-        db.delete(db_user)
+    # The tasks go with the ON DELETE CASCADE foreign key, they are not loaded.
+    statement = delete(schemas.User).where(schemas.User.id == user_id) \
+        .returning(schemas.User.email).execution_options(synchronize_session=False)
+    if (email := db.scalar(statement)) is not None:
         db.commit()
+        oauth2_jwt.invalidate_user(email)
+        stats.invalidate_task_stats()  # the user's tasks went with them
         return True
     return False
 
 
-def get_tasks(db: Session, offset: int = 0, limit: int = 100):
-    return db.query(schemas.Task).offset(offset).limit(limit).all()
+def task_filters(owner_id=None, status=None, created_after=None, created_before=None,
+                 updated_after=None, updated_before=None, name_prefix=None) -> list:
+    # WHERE conditions shared by the task listing and the export. Owner and status are
+    # served by the (owner_id | status, created_at, id) indexes.
+    conditions = []
+    if owner_id is not None:
+        conditions.append(schemas.Task.owner_id == owner_id)
+    if status is not None:
+        conditions.append(schemas.Task.status == status)
+    if created_after is not None:
+        conditions.append(schemas.Task.created_at >= created_after)
+    if created_before is not None:
+        conditions.append(schemas.Task.created_at < created_before)
+    if updated_after is not None:
+        conditions.append(schemas.Task.updated_at >= updated_after)
+    if updated_before is not None:
+        conditions.append(schemas.Task.updated_at < updated_before)
+    if name_prefix:
+        conditions.append(schemas.Task.name.startswith(name_prefix, autoescape=True))
+    return conditions
+
+
+def get_tasks(db: Session, offset: int = 0, limit: int = 100, after: tuple | None = None,
+              filters: dict | None = None, sort: str = 'created_at'):
+    query = db.query(schemas.Task).filter(*task_filters(**(filters or {})))
+    return paginate(query, schemas.Task, offset=offset, limit=limit, after=after, sort=sort).all()
 
 
 def get_task(db: Session, task_id: str):
@@ -68,6 +120,7 @@ def create_task(db: Session, task: models.TaskCreate):
     )
     db.add(db_task)
     db.commit()
+    stats.invalidate_task_stats()
     db.refresh(db_task)
     return db_task
 
@@ -77,38 +130,132 @@ def create_user_task(db: Session, task: models.TaskCreate, user_id: str):
         db_task = schemas.Task(**task.dict(), id=uuid4(), owner_id=user_id)
         db.add(db_task)
         db.commit()
+        stats.invalidate_task_stats()
         db.refresh(db_task)
         return db_task
     return None
 
 
-def get_user_tasks(db: Session, user_id: str, offset: int = 0, limit: int = 100):
-    return db.query(schemas.Task).filter(schemas.Task.owner_id == user_id).offset(offset).limit(limit).all()
+def get_user_tasks(db: Session, user_id: str, offset: int = 0, limit: int = 100, after: tuple | None = None):
+    query = db.query(schemas.Task).filter(schemas.Task.owner_id == user_id)
+    return paginate(query, schemas.Task, offset=offset, limit=limit, after=after).all()
 
 
-def update_task(db: Session, task_id: str, task: models.TaskUpdate):
-    if db_task := db.query(schemas.Task).filter(schemas.Task.id == task_id).first():
-        if task.name is not None:
-            db_task.name = task.name
-        if task.description is not None:
-            db_task.description = task.description
-        if task.status is not None:
-            db_task.status = task.status
-        
+def update_task(db: Session, task_id: str, task: models.TaskUpdate, versions: list | None = None):
+    # One UPDATE ... RETURNING instead of SELECT, flush and refresh.
+    # With ``versions`` (If-Match) only a task whose updated_at is one of them is updated.
+    values = task.model_dump(exclude_none=True)
+    if not values:
+        db_task = get_task(db, task_id)
+        return db_task if db_task and (versions is None or db_task.updated_at in versions) else None
+    statement = update(schemas.Task).where(schemas.Task.id == task_id).values(**values) \
+        .returning(schemas.Task).execution_options(synchronize_session=False)
+    if versions is not None:
+        statement = statement.where(schemas.Task.updated_at.in_(versions))
+    if db_task := db.scalars(statement).first():
         db.commit()
-        db.refresh(db_task)
+        stats.invalidate_task_stats()
         return db_task
     return None
 
 
 def delete_task(db: Session, task_id: str):
-    if db_task := db.query(schemas.Task).filter(schemas.Task.id == task_id).first():
-        db.delete(db_task)
+    statement = delete(schemas.Task).where(schemas.Task.id == task_id) \
+        .returning(schemas.Task.id).execution_options(synchronize_session=False)
+    if db.scalar(statement) is not None:
         db.commit()
+        stats.invalidate_task_stats()
         return True
     return False
 
 
+def search_tasks(db: Session, q: str, offset: int = 0, limit: int = 10):
+    # Best match first (ts_rank on PostgreSQL, bm25 on SQLite) over every match, the id breaks
+    # ties for stable pages. The page is cut inside the match query, only its rows join tasks.
+    if not q.split():
+        return []
+    if db.get_bind().dialect.name == 'postgresql':
+        tsquery = func.websearch_to_tsquery(cast(SEARCH_LANGUAGE, REGCONFIG), q)
+        vector = literal_column('tasks.search_vector')
+        rank = (-func.ts_rank(vector, tsquery)).label('rank')
+        matches = select(schemas.Task.id, rank).where(vector.op('@@')(tsquery)).order_by(rank, schemas.Task.id)
+        key = schemas.Task.id
+    else:
+        rowid = literal_column('rowid').label('id')
+        matches = select(rowid, literal_column('rank')).select_from(table('tasks_fts')) \
+            .where(literal_column('tasks_fts').op('MATCH')(fts5_query(q))).order_by(literal_column('rank'), rowid)
+        key = literal_column('tasks.rowid')
+    matches = matches.offset(offset).limit(limit).subquery('matches')
+    query = db.query(schemas.Task).join(matches, matches.c.id == key)
+    return query.order_by(matches.c.rank, matches.c.id).all()
+
+
+def export_tasks(**filters):
+    # A column-only SELECT for utils.export, no ORM objects are built.
+    statement = select(*schemas.Task.__table__.columns).where(*task_filters(**filters))
+    return statement.order_by(schemas.Task.created_at, schemas.Task.id)
+
+
+def task_stats(db: Session, filters: dict | None = None, by_day: bool = False):
+    # Task counts per owner and status (and creation day), grouped in the database.
+    day = func.date(schemas.Task.created_at).label('day')
+    columns = [schemas.Task.owner_id, schemas.Task.status] + ([day] if by_day else [])
+    statement = select(*columns, func.count().label('count')) \
+        .where(*task_filters(**(filters or {}))).group_by(*columns).order_by(*columns)
+    return db.execute(statement).mappings().all()
+
+
+def create_tasks(db: Session, tasks: list[models.TaskBulkCreate]):
+    # One SELECT for the owners, one multi-row INSERT ... RETURNING and one commit.
+    # Returns the created tasks in request order, None where the owner does not exist.
+    owner_ids = {task.owner_id for task in tasks if task.owner_id is not None}
+    owners = set(db.scalars(select(schemas.User.id).where(schemas.User.id.in_(owner_ids)))) if owner_ids else set()
+    rows = [
+        dict(id=uuid4(), name=task.name, description=task.description, status=task.status, owner_id=task.owner_id)
+        if task.owner_id is None or task.owner_id in owners else None
+        for task in tasks
+    ]
+    created = {}
+    if valid := [row for row in rows if row is not None]:
+        created = {db_task.id: db_task for db_task in db.scalars(insert(schemas.Task).values(valid).returning(schemas.Task))}
+        db.commit()
+        stats.invalidate_task_stats()
+    return [created.get(row['id']) if row is not None else None for row in rows]
+
+
+def update_tasks(db: Session, tasks: list[models.TaskBulkUpdate]):
+    # A single UPDATE ... RETURNING: each column is set through a CASE on the task id.
+    # Returns the updated tasks in request order, None where the task does not exist.
+    changes = {}
+    for task in tasks:
+        changes.setdefault(task.id, {}).update(task.model_dump(exclude={'id'}, exclude_none=True))
+    values = {}
+    for name in ('name', 'description', 'status'):
+        column = getattr(schemas.Task, name)
+        # Typed binds: drivers like asyncpg would otherwise have to infer them from the CASE.
+        if whens := {task_id: literal(fields[name], type_=column.type) for task_id, fields in changes.items() if name in fields}:
+            values[name] = case(whens, value=schemas.Task.id, else_=column)
+    if values:
+        statement = update(schemas.Task).where(schemas.Task.id.in_(changes)).values(**values) \
+            .returning(schemas.Task).execution_options(synchronize_session=False)
+    else:
+        statement = select(schemas.Task).where(schemas.Task.id.in_(changes))
+    updated = {db_task.id: db_task for db_task in db.scalars(statement)}
+    db.commit()
+    stats.invalidate_task_stats()
+    return [updated.get(task.id) for task in tasks]
+
+
+def delete_tasks(db: Session, task_ids: list):
+    # A single DELETE ... RETURNING id. Returns whether each task existed, in request order.
+    statement = delete(schemas.Task).where(schemas.Task.id.in_(task_ids)) \
+        .returning(schemas.Task.id).execution_options(synchronize_session=False)
+    deleted = set(db.scalars(statement))
+    db.commit()
+    stats.invalidate_task_stats()
+    return [task_id in deleted for task_id in task_ids]
+
+
 def create_weather(db: Session, weather: dict):
     db_weather = schemas.Weather(
         id=uuid4(), hostname=weather['hostname'], 
@@ -116,11 +263,74 @@ def create_weather(db: Session, weather: dict):
         weather=weather['weather'], temperature=weather['temperature'],
         humidity=weather['humidity'], wind_speed=weather['wind_speed']
     )
+    if weather.get('created_at') is not None:
+        db_weather.created_at = weather['created_at']  # time of the request, not of the insert
     db.add(db_weather)
     db.commit()
     db.refresh(db_weather)
     return db_weather
 
 
-def get_weathers(db: Session, offset: int = 0, limit: int = 100):
-    return db.query(schemas.Weather).offset(offset).limit(limit).all()
+def create_weathers(db: Session, weathers: list[dict]):
+    # One multi-row INSERT and one commit for the whole batch.
+    rows = [
+        dict(
+            id=uuid4(), hostname=weather['hostname'],
+            country=weather['country'], city=weather['city'],
+            weather=weather['weather'], temperature=weather['temperature'],
+            humidity=weather['humidity'], wind_speed=weather['wind_speed'],
+            created_at=weather.get('created_at', func.now())
+        ) for weather in weathers
+    ]
+    if rows:
+        db.execute(insert(schemas.Weather).values(rows))
+        db.commit()
+    return len(rows)
+
+
+def get_weathers(db: Session, offset: int = 0, limit: int = 100, after: tuple | None = None):
+    return paginate(db.query(schemas.Weather), schemas.Weather, offset=offset, limit=limit, after=after).all()
+
+
+def export_weathers(hostname=None, country=None, created_after=None, created_before=None):
+    statement = select(*schemas.Weather.__table__.columns)
+    if hostname is not None:
+        statement = statement.where(schemas.Weather.hostname == hostname)
+    if country is not None:
+        statement = statement.where(schemas.Weather.country == country)
+    if created_after is not None:
+        statement = statement.where(schemas.Weather.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(schemas.Weather.created_at < created_before)
+    return statement.order_by(schemas.Weather.created_at, schemas.Weather.id)
+
+
+def weather_stats(db: Session, country=None, created_after=None, created_before=None, by_city: bool = False):
+    # Request counts and weather averages per country (and city) over a time window.
+    columns = [schemas.Weather.country] + ([schemas.Weather.city] if by_city else [])
+    statement = select(
+        *columns,
+        func.count().label('requests'),
+        func.avg(schemas.Weather.temperature).label('avg_temperature'),
+        func.min(schemas.Weather.temperature).label('min_temperature'),
+        func.max(schemas.Weather.temperature).label('max_temperature'),
+        func.avg(schemas.Weather.humidity).label('avg_humidity'),
+        func.avg(schemas.Weather.wind_speed).label('avg_wind_speed'),
+    )
+    if country is not None:
+        statement = statement.where(schemas.Weather.country == country)
+    if created_after is not None:
+        statement = statement.where(schemas.Weather.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(schemas.Weather.created_at < created_before)
+    return db.execute(statement.group_by(*columns).order_by(*columns)).mappings().all()
+
+
+def purge_weathers(db: Session, before, batch_size: int = 5000):
+    # Deletes one batch of the oldest rows created before ``before``, returns how many.
+    oldest = select(schemas.Weather.id).where(schemas.Weather.created_at < before) \
+        .order_by(schemas.Weather.created_at).limit(batch_size)
+    result = db.execute(delete(schemas.Weather).where(schemas.Weather.id.in_(oldest.scalar_subquery()))
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,86 @@
+### Background enrichment pipeline: bounded queue drained by worker tasks off the request path.
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentPipeline:
+    """Queue items from the request path and process them in background workers.
+
+    ``submit`` never waits: when the queue is full (or the pipeline is not running)
+    the item is dropped and counted instead of slowing the request down.
+    """
+
+    def __init__(self, handler, maxsize: int = 10000, workers: int = 1):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.queue: asyncio.Queue | None = None
+        self.running = False
+        self._tasks: list[asyncio.Task] = []
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, *item) -> bool:
+        if not self.running:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def start(self):
+        if self.running:
+            return
+        # The queue is created here so it binds to the loop that runs the app lifespan.
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.running = True
+
+    async def stop(self, timeout: float | None = None):
+        """Stop accepting items, flush what is already queued and stop the workers."""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Enrichment pipeline flush timed out, %s items discarded', self.queue.qsize())
+            self.dropped += self.queue.qsize()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.handler(*item)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception('Enrichment handler failed for %s', item)
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running,
+            'queued': self.queue.qsize() if self.queue else 0,
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
@@ -0,0 +1,59 @@
+### Strong ETags built from a row's id and updated_at, for conditional GET and PUT.
+# The tag is readable back into updated_at, so If-Match becomes a WHERE updated_at = ...
+# condition on the UPDATE itself instead of a read before the write.
+import hashlib
+from datetime import datetime, timedelta
+from uuid import UUID
+from fastapi import HTTPException, Request, Response, status
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def make_etag(id: UUID, updated_at: datetime | None, *parts) -> str:
+    """``"<id>.<updated_at in µs>"``, plus a digest of ``parts`` for content that has its own versions."""
+    tag = f'{id.hex}.{(updated_at - EPOCH) // MICROSECOND if updated_at else 0:x}'
+    if parts:
+        tag += '.' + hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'"{tag}"'
+
+
+def parse_tags(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 response when If-None-Match holds ``etag`` (weak comparison), else None."""
+    if (header := request.headers.get('if-none-match')) is None:
+        return None
+    tags = [tag.removeprefix('W/') for tag in parse_tags(header)]
+    if '*' in tags or etag in tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
+
+
+def if_match_versions(request: Request, id: UUID) -> list[datetime] | None:
+    """The updated_at values If-Match accepts for row ``id``; None when any version goes.
+
+    Tags of other rows, weak or malformed tags never match (412).
+    """
+    header = request.headers.get('if-match')
+    if header is None or header.strip() == '*':
+        return None
+    versions = []
+    for tag in parse_tags(header):
+        row, _, version = tag.strip('"').partition('.')
+        if tag.startswith('"') and row == id.hex:
+            try:
+                versions.append(EPOCH + int(version.split('.')[0], 16) * MICROSECOND)
+            except ValueError:
+                pass
+    if not versions:
+        raise precondition_failed()
+    return versions
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                         detail="The resource was modified, fetch it again before updating")
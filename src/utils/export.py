@@ -0,0 +1,57 @@
+### Streaming exports: rows leave the database cursor in batches and go out as NDJSON or CSV.
+# The session is opened inside the response body, request dependencies are closed by then.
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+from ..databases import database
+from ..models import models
+
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+MEDIA_TYPES = {models.ExportFormatEnum.NDJSON: 'application/x-ndjson', models.ExportFormatEnum.CSV: 'text/csv'}
+
+
+def to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def encode(columns: list[str], rows, format: models.ExportFormatEnum) -> str:
+    if format == models.ExportFormatEnum.CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return ''.join(json.dumps(dict(zip(columns, row)), default=to_json) + '\n' for row in rows)
+
+
+def sync_batches(statement):
+    # yield_per turns on server-side cursors (stream_results) where the driver has them.
+    with database.SessionLocal() as db:
+        yield from db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions()
+
+
+async def async_batches(statement):
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield rows
+
+
+async def stream_rows(statement, format: models.ExportFormatEnum):
+    columns = [column.name for column in statement.selected_columns]
+    if format == models.ExportFormatEnum.CSV:
+        yield encode(columns, [columns], format)
+    batches = async_batches(statement) if database.ASYNC_MODE else iterate_in_threadpool(sync_batches(statement))
+    async for rows in batches:
+        yield encode(columns, rows, format)
+
+
+def export_response(statement, format: models.ExportFormatEnum, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(statement, format), media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{format.value}"'})
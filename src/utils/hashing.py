@@ -0,0 +1,90 @@
+### Password hashing off the event loop: bcrypt runs in a dedicated, bounded executor.
+import os
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cache
+from fastapi import HTTPException, status
+
+from ..utils.metrics import Histogram
+
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))  # cost factor, each +1 doubles hashing time
+HASH_EXECUTOR = os.getenv('HASH_EXECUTOR', 'thread')  # thread | process
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# Hash jobs running or queued before new ones are rejected with 503.
+HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', 64))
+
+hash_seconds = Histogram()
+verify_seconds = Histogram()
+pending = 0
+rejected = 0
+_executor: Executor | None = None
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        executor_class = ProcessPoolExecutor if HASH_EXECUTOR == 'process' else ThreadPoolExecutor
+        _executor = executor_class(max_workers=HASH_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+@cache
+def pwd_context():
+    # Built on first use, passlib and its bcrypt backend are not needed to import the app.
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# Module level functions so they can be pickled for a process pool.
+def hash_sync(password: str) -> str:
+    return pwd_context().hash(password)
+
+
+def verify_sync(password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(password, hashed_password)
+
+
+async def _run(histogram: Histogram, fn, *args):
+    global pending, rejected
+    if pending >= HASH_MAX_PENDING:
+        rejected += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, retry later", headers={"Retry-After": "1"})
+
+    pending += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+    finally:
+        pending -= 1
+        histogram.observe(time.perf_counter() - started)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_seconds, hash_sync, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(verify_seconds, verify_sync, password, hashed_password)
+
+
+def stats() -> dict:
+    return {
+        'executor': HASH_EXECUTOR,
+        'workers': HASH_WORKERS,
+        'bcrypt_rounds': BCRYPT_ROUNDS,
+        'pending': pending,
+        'max_pending': HASH_MAX_PENDING,
+        'rejected': rejected,
+        'hash_seconds': hash_seconds.snapshot(),
+        'verify_seconds': verify_seconds.snapshot(),
+    }
@@ -0,0 +1,125 @@
+### Application-scoped outbound HTTP client (connection pooling, timeouts, circuit breaker).
+import os
+import time
+import httpx
+
+from ..utils.request_metrics import request_metrics
+
+
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 5))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', 5))
+# Consecutive upstream failures before the breaker opens, 0 disables the breaker.
+CIRCUIT_BREAKER_FAILURES = int(os.getenv('CIRCUIT_BREAKER_FAILURES', 5))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.getenv('CIRCUIT_BREAKER_RESET_TIMEOUT', 30))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after ``max_failures`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through (half-open); its
+    outcome closes the breaker again or re-opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, max_failures: int, reset_timeout: float):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'half-open':
+            self.opened_at = time.monotonic()  # let a single trial call through
+            return True
+        if state == 'open':
+            self.rejected += 1
+            return False
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+_client: httpx.AsyncClient | None = None
+breaker = CircuitBreaker(CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_TIMEOUT) if CIRCUIT_BREAKER_FAILURES > 0 else None
+
+
+def create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT,
+            write=HTTP_READ_TIMEOUT, pool=HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+async def start_client():
+    global _client
+    if _client is None:
+        _client = create_client()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError('HTTP client is not started, it is created in the app lifespan')
+    return _client
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET through the shared client, guarded by the circuit breaker when enabled."""
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(f'Circuit open for {url}')
+    started = time.perf_counter()
+    try:
+        response = await get_client().get(url, **kwargs)
+    except httpx.HTTPError:
+        request_metrics.observe_outbound(httpx.URL(url).host, 'error', time.perf_counter() - started)
+        if breaker is not None:
+            breaker.record_failure()
+        raise
+    request_metrics.observe_outbound(response.url.host, response.status_code, time.perf_counter() - started)
+
+    if breaker is not None:
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    return response
@@ -0,0 +1,63 @@
+### Lightweight in-process metric primitives.
+from bisect import bisect_left
+
+
+# Seconds, suited to DB checkouts and HTTP/DB latencies.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Fixed-bucket histogram, ``observe`` is a couple of list/attribute updates."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(upper bound, cumulative count) pairs, ending with ``+Inf``."""
+        total, result = 0, []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'buckets': dict(self.cumulative()),
+        }
+
+
+### Prometheus text exposition format.
+def _labels(names: tuple, values: tuple, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def prometheus_samples(name: str, help: str, type: str, series: dict, labels: tuple = ()) -> list[str]:
+    """Lines of a counter or gauge, ``series`` maps label values to numbers."""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {type}']
+    lines += [f'{name}{_labels(labels, values)} {value}' for values, value in list(series.items())]
+    return lines
+
+
+def prometheus_histogram(name: str, help: str, series: dict, labels: tuple = ()) -> list[str]:
+    """Lines of a histogram, ``series`` maps label values to a ``Histogram``."""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} histogram']
+    for values, histogram in list(series.items()):
+        lines += [f'{name}_bucket{_labels(labels, values, le=bound)} {total}' for bound, total in histogram.cumulative()]
+        lines.append(f'{name}_sum{_labels(labels, values)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(labels, values)} {histogram.count}')
+    return lines
@@ -1,47 +1,122 @@
 import os
+from datetime import datetime, timedelta, timezone
 from fastapi import Request
-import geocoder
-import httpx
+from starlette.concurrency import run_in_threadpool
 
 from ..databases import database
-from ..utils import crud
+from ..utils import crud, http_client
+from ..utils.cache import TTLCache
+from ..utils.enrichment import EnrichmentPipeline
+from ..utils.recording import MemoryDedupStore, RecordingPolicy, RedisDedupStore, parse_list, parse_rates
+from ..utils.retention import RetentionJob
+from ..utils.write_behind import WriteBehindBuffer
 
 API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+ENRICHMENT_QUEUE_SIZE = int(os.getenv('ENRICHMENT_QUEUE_SIZE', 10000))
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', 4))
+ENRICHMENT_SHUTDOWN_TIMEOUT = float(os.getenv('ENRICHMENT_SHUTDOWN_TIMEOUT', 10))
+GEO_CACHE_SIZE = int(os.getenv('GEO_CACHE_SIZE', 10000))
+GEO_CACHE_TTL = float(os.getenv('GEO_CACHE_TTL', 86400))
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', 1000))
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', 600))
+LOOKUP_NEGATIVE_TTL = float(os.getenv('LOOKUP_NEGATIVE_TTL', 60))  # failed or empty lookups
+WEATHER_BUFFER_MAX_ROWS = int(os.getenv('WEATHER_BUFFER_MAX_ROWS', 10000))
+WEATHER_BUFFER_BATCH_SIZE = int(os.getenv('WEATHER_BUFFER_BATCH_SIZE', 500))
+WEATHER_BUFFER_FLUSH_INTERVAL = float(os.getenv('WEATHER_BUFFER_FLUSH_INTERVAL', 2))
+WEATHER_SAMPLE_RATE = float(os.getenv('WEATHER_SAMPLE_RATE', 1))  # share of requests recorded
+WEATHER_SAMPLE_RATES = parse_rates(os.getenv('WEATHER_SAMPLE_RATES', ''))  # per host: 'host=rate,...'
+WEATHER_DEDUP_INTERVAL = float(os.getenv('WEATHER_DEDUP_INTERVAL', 300))  # one row per (host, country), 0 disables
+WEATHER_DEDUP_CACHE_SIZE = int(os.getenv('WEATHER_DEDUP_CACHE_SIZE', 100000))
+WEATHER_DEDUP_REDIS_URL = os.getenv('WEATHER_DEDUP_REDIS_URL')  # share dedup across workers
+WEATHER_PATH_ALLOW = parse_list(os.getenv('WEATHER_PATH_ALLOW', ''))  # path prefixes, empty allows all
+WEATHER_PATH_DENY = parse_list(os.getenv(
+    'WEATHER_PATH_DENY', '/swagger-ui,/docs,/redoc,/openapi.json,/favicon.ico,/health,/internal,/metrics'))
+WEATHER_RETENTION_DAYS = float(os.getenv('WEATHER_RETENTION_DAYS', 0))  # 0 keeps every row
+WEATHER_RETENTION_INTERVAL = float(os.getenv('WEATHER_RETENTION_INTERVAL', 3600))
+WEATHER_RETENTION_BATCH_SIZE = int(os.getenv('WEATHER_RETENTION_BATCH_SIZE', 5000))
+
+# hostname -> country, country -> weather data
+geo_cache = TTLCache(maxsize=GEO_CACHE_SIZE, ttl=GEO_CACHE_TTL, negative_ttl=LOOKUP_NEGATIVE_TTL)
+weather_cache = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, negative_ttl=LOOKUP_NEGATIVE_TTL)
+
 
 async def log_request(request: Request, call_next):
     hostname = request.client.host  # hostname of request
     if hostname in ['localhost', '127.0.0.1', '::1']:
         hostname = 'me'
-    
-    g = geocoder.ip(hostname)  # data from hostname
-    # g.city g.state g.country
-    country = g.country if g.country else "Unknown"  
+
+    # Geo-IP and weather lookups run in the background pipeline, never on the request path.
+    if recording.admit(hostname, request.url.path):
+        pipeline.submit(hostname, datetime.now(timezone.utc))
+
+    response = await call_next(request)
+    return response
+
+
+async def record_weather(hostname: str, timestamp: datetime):
+    country = await geo_cache.get_or_load(hostname, lambda: get_country(hostname))
+    country = country if country else "Unknown"
 
     # Get the weather info
-    weather_data = await get_weather(country)  
+    weather_data = await weather_cache.get_or_load(country, lambda: get_weather(country))
     # country, city, weather, temperature, humidity, wind_speed
-    if weather_data:
-        data = {**weather_data, 'hostname': hostname}
-        db = database.SessionLocal()
-        crud.create_weather(db, weather=data)  # save weather data in database
-
-    response = await call_next(request)  
-    return response  
-
-async def get_weather(country: str):  
-    async with httpx.AsyncClient() as client:  
-        response = await client.get(  
-            f"http://api.openweathermap.org/data/2.5/weather?q={country}&appid={API_KEY}&units=metric"  
+    if weather_data and await recording.claim(hostname, country):
+        data = {**weather_data, 'hostname': hostname, 'created_at': timestamp}
+        weather_buffer.add(data)  # saved in database by the next batch flush
+
+
+async def get_country(hostname: str):
+    import geocoder  # imported on first lookup, it pulls in requests
+    g = await run_in_threadpool(geocoder.ip, hostname)  # data from hostname (blocking call)
+    # g.city g.state g.country
+    return g.country
+
+
+def save_weathers(rows: list[dict]):
+    with database.SessionLocal() as db:  # connection is always returned to the pool
+        crud.create_weathers(db, weathers=rows)
+
+
+def purge_weathers(cutoff: datetime) -> int:
+    # Small batches, each in its own transaction, so concurrent inserts are never blocked for long.
+    deleted = 0
+    with database.SessionLocal() as db:
+        while (count := crud.purge_weathers(db, before=cutoff, batch_size=WEATHER_RETENTION_BATCH_SIZE)):
+            deleted += count
+            if count < WEATHER_RETENTION_BATCH_SIZE:
+                break
+    return deleted
+
+
+async def get_weather(country: str):
+    try:
+        response = await http_client.get(
+            "http://api.openweathermap.org/data/2.5/weather",
+            params={'q': country, 'appid': API_KEY, 'units': 'metric'},
         )
+    except http_client.CircuitOpenError:
+        return None  # upstream is failing, skip the call until the breaker resets
+
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            'country': data['sys']['country'],
+            'city': data['name'],
+            'weather': data['weather'][0]['description'],
+            'temperature': data['main']['temp'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed']
+        }
+    return None
+
 
-        if response.status_code == 200:  
-            data = response.json()
-            return {
-                'country': data['sys']['country'],
-                'city': data['name'],
-                'weather': data['weather'][0]['description'],
-                'temperature': data['main']['temp'],
-                'humidity': data['main']['humidity'],
-                'wind_speed': data['wind']['speed']
-            }
-        return None
\ No newline at end of file
+recording = RecordingPolicy(
+    sample_rate=WEATHER_SAMPLE_RATE, host_rates=WEATHER_SAMPLE_RATES, dedup_interval=WEATHER_DEDUP_INTERVAL,
+    store=RedisDedupStore(WEATHER_DEDUP_REDIS_URL) if WEATHER_DEDUP_REDIS_URL else MemoryDedupStore(WEATHER_DEDUP_CACHE_SIZE),
+    allow_paths=WEATHER_PATH_ALLOW, deny_paths=WEATHER_PATH_DENY)
+weather_buffer = WriteBehindBuffer(
+    save_weathers, batch_size=WEATHER_BUFFER_BATCH_SIZE,
+    flush_interval=WEATHER_BUFFER_FLUSH_INTERVAL, max_rows=WEATHER_BUFFER_MAX_ROWS)
+pipeline = EnrichmentPipeline(record_weather, maxsize=ENRICHMENT_QUEUE_SIZE, workers=ENRICHMENT_WORKERS)
+weather_retention = RetentionJob(
+    purge_weathers, retention=timedelta(days=WEATHER_RETENTION_DAYS), interval=WEATHER_RETENTION_INTERVAL)
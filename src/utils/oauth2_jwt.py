@@ -1,18 +1,19 @@
 ### OAuth2 with Password (and hashing), Bearer with JWT tokens
 import os
+import time
+import hashlib
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from typing import Annotated, Optional, List
 from fastapi import Depends, APIRouter, HTTPException, status, Body, Path, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose.exceptions import JWTError
 from pydantic import BaseModel
 
-from ..databases.database import Base, get_db as database_get_db
+from ..databases.database import Base, DBSession, get_db as database_get_db
 from ..models import models
-from ..utils import crud
+from ..utils import async_crud, hashing
+from ..utils.cache import TTLCache
 
 load_dotenv()  
 
@@ -33,25 +34,44 @@ class TokenData(BaseModel):
 SECRET_KEY = os.getenv('SECRET_KEY', '4bd037cebda1f8b35517b3d178a3363a012445dd281f6e0f704b1a9620dc4637')
 ALGORITHM = os.getenv('ALGORITHM', 'HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', 30))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+
+### VERIFIED TOKEN AND CURRENT USER CACHES ###
+# sha256(token) -> email, each entry expires with the token "exp" claim.
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# email -> models.UserPrincipal (id, name, email, is_active), invalidated by crud.update_user/delete_user.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, negative_ttl=0)
+
+
+def invalidate_user(email: str):
+    user_cache.pop(email)
+
 
 ### HASH AND VERIFY PASSWORD UTILITIES ###
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Blocking helpers, request handlers await hashing.hash_password/verify_password instead.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(password, hashed_password):
-    return pwd_context.verify(password, hashed_password)
+    return hashing.verify_sync(password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing.hash_sync(password)
+
+
+def jose_jwt():
+    from jose import jwt  # imported on first token use, it loads python-jose's crypto backends
+    return jwt
 
 
-def authenticate_user(email: str, password: str, db: Session = Depends(database_get_db)):
-    user_found = crud.get_user_by_email(db=db, email=email)
+async def authenticate_user(email: str, password: str, db: DBSession = Depends(database_get_db)):
+    user_found = await async_crud.get_user_by_email(db=db, email=email, include_tasks=False)
     
     if not user_found:
         return False
-    if not verify_password(password, user_found.hashed_password):
+    if not await hashing.verify_password(password, user_found.hashed_password):
         return False
     return user_found
 
@@ -64,34 +84,42 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jose_jwt().encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 # Receive, decode and verify received JWT token, return current user or HTTP error if invalid.
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], 
-    db: Session = Depends(database_get_db)):
+    db: DBSession = Depends(database_get_db)):
 
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"},)
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    if (email := token_cache.get(token_key)) is None:
+        try:
+            payload = jose_jwt().decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+            token_data = TokenData(email=email)
+
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(email=email)
 
-    except JWTError:
-        raise credentials_exception
+        expires_in = payload['exp'] - time.time() if 'exp' in payload else None
+        token_cache.set(token_key, token_data.email, ttl=expires_in)
 
-    user_found = crud.get_user_by_email(db=db, email=token_data.email)
-    if user_found is None:
-        raise credentials_exception
-    return user_found
+    if (user := user_cache.get(email)) is None:
+        user_found = await async_crud.get_user_by_email(db=db, email=email, include_tasks=False)
+        if user_found is None:
+            raise credentials_exception
+        user = models.UserPrincipal.model_validate(user_found)
+        user_cache.set(email, user)
+    return user
 
 
-async def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)],):
+async def get_current_active_user(current_user: Annotated[models.UserPrincipal, Depends(get_current_user)],):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -100,9 +128,9 @@ async def get_current_active_user(current_user: Annotated[models.User, Depends(g
 # Create JWT access token, timedelta for expiration time.
 @router.post("/token", response_model=Token)
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], 
-    db: Session = Depends(database_get_db)) -> Token:
+    db: DBSession = Depends(database_get_db)) -> Token:
 
-    user = authenticate_user(email=form_data.username, password=form_data.password, db=db)
+    user = await authenticate_user(email=form_data.username, password=form_data.password, db=db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password", headers={"WWW-Authenticate": "Bearer"},)
@@ -114,13 +142,19 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 
 
 @router.get("/users/me/", response_model=models.User)
-async def read_users_me(current_user: Annotated[models.User, Depends(get_current_active_user)],):
-    return current_user
+async def read_users_me(current_user: Annotated[models.UserPrincipal, Depends(get_current_active_user)],
+    include_tasks: Annotated[bool, Query(title='Include tasks', description='Embed the user\'s tasks, false returns an empty list.')] = True,
+    db: DBSession = Depends(database_get_db)):
+    # The body comes from the read cache, which user and task writes invalidate.
+    if (user := await async_crud.get_user(db, user_id=current_user.id, include_tasks=include_tasks)) is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"},)
+    return user
 
 
 @router.post("/users/me/", response_model=models.User)
-def register(user: Annotated[models.UserCreate, Body()] = None, db: Session = Depends(database_get_db)):
+async def register(user: Annotated[models.UserCreate, Body()] = None, db: DBSession = Depends(database_get_db)):
 
-    if db_user := crud.get_user_by_email(db, email=user.email):
+    if db_user := await async_crud.get_user_by_email(db, email=user.email, include_tasks=False):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Email: {db_user.email} already registered")
-    return crud.create_user(db=db, user=user)
+    return await async_crud.create_user(db=db, user=user)
@@ -0,0 +1,54 @@
+### Offset and keyset (cursor) pagination over the indexed (created_at, id) columns.
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Return the (created_at, id) position encoded in an opaque cursor, 400 if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def page_after(cursor: str | None, offset: int, sort: str = 'created_at') -> tuple[datetime, UUID] | None:
+    if cursor is None:
+        return None
+    if offset:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either cursor or offset, not both")
+    if sort != 'created_at':
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursors page only the default created_at order")
+    return decode_cursor(cursor)
+
+
+def paginate(query, model, offset: int = 0, limit: int = 100, after: tuple | None = None, sort: str = 'created_at'):
+    """Order by (created_at, id); page by keyset when ``after`` is given, by offset otherwise.
+
+    Another ``sort`` column ('-' prefix for descending) orders by (column, id) and pages by offset.
+    """
+    if sort != 'created_at':
+        column = getattr(model, sort.lstrip('-'))
+        if sort.startswith('-'):
+            return query.order_by(column.desc(), model.id.desc()).offset(offset).limit(limit)
+        return query.order_by(column, model.id).offset(offset).limit(limit)
+    query = query.order_by(model.created_at, model.id)
+    if after is not None:
+        return query.filter(tuple_(model.created_at, model.id) > tuple(after)).limit(limit)
+    return query.offset(offset).limit(limit)
+
+
+def set_next_cursor(response: Response, rows: list, limit: int, sort: str = 'created_at'):
+    # A full page may have a successor, its cursor points after the last row.
+    if rows and len(rows) == limit and sort == 'created_at':
+        response.headers['X-Next-Cursor'] = encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,210 @@
+### Read-through cache of hot CRUD reads, stored as serialized model bytes.
+# Backends: an in-process LRU (default) or a Redis-protocol server shared by every worker.
+# Single entities are deleted by the writes that change them; pages and other derived
+# entries embed a generation counter in their key, and writes bump the counter instead.
+# A deleted key also gets a fresh fence, so a load that raced the write does not store its old row.
+import asyncio
+import logging
+import os
+from uuid import uuid4
+from pydantic import TypeAdapter
+
+from ..utils.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+READ_CACHE_BACKEND = os.getenv('READ_CACHE_BACKEND', 'memory')  # memory | redis
+READ_CACHE_REDIS_URL = os.getenv('READ_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+READ_CACHE_SIZE = int(os.getenv('READ_CACHE_SIZE', 10000))
+READ_CACHE_TTL = float(os.getenv('READ_CACHE_TTL', 30))  # 0 disables caching
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL. Counters are kept apart and never evicted."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.entries = TTLCache(maxsize=maxsize)
+        self.counters: dict[str, int] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries.set(key, value, ttl=ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.entries.pop(key)
+
+    async def counter(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+
+class RedisBackend:
+    """Any Redis-protocol server (Redis, Valkey, KeyDB...). Needs the optional ``redis`` package."""
+
+    def __init__(self, url: str | None = None, client=None, prefix: str = 'read-cache:'):
+        if client is None:
+            try:
+                import redis.asyncio
+            except ImportError as e:
+                raise RuntimeError("READ_CACHE_BACKEND=redis needs the 'redis' package (pip install redis)") from e
+            client = redis.asyncio.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def counter(self, key: str) -> int:
+        return int(await self.client.get(self.prefix + key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+
+class ReadCache:
+    """Read-through cache over a backend with per-process stampede protection.
+
+    Concurrent misses of one key share a single ``loader()`` call. Backend failures are
+    counted and fall through to the loader, the database stays the source of truth.
+    ``None`` results (not found) are not cached. An entry whose key was invalidated while
+    it loaded is dropped again: ``invalidate`` moves the key's fence before deleting it,
+    and the loader compares the fence it read before loading with the one after storing.
+    """
+
+    def __init__(self, backend, ttl: float = 30):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.stale_drops = 0
+        self.errors = 0
+
+    async def versioned_key(self, key: str, *generations: str) -> str | None:
+        """``key`` suffixed with the current value of each generation counter, None if the backend fails."""
+        try:
+            values = [await self.backend.counter(f'generation:{name}') for name in generations]
+        except Exception:
+            self.errors += 1
+            logger.warning('Read cache backend failed', exc_info=True)
+            return None
+        return ':'.join([key, *map(str, values)])
+
+    async def bump(self, *names: str):
+        self.invalidations += 1
+        for name in names:
+            try:
+                await self.backend.incr(f'generation:{name}')
+            except Exception:
+                self.errors += 1
+                logger.warning('Read cache backend failed', exc_info=True)
+
+    async def fence(self, key: str) -> bytes | None:
+        return await self.backend.get(f'fence:{key}')
+
+    async def invalidate(self, *keys: str):
+        self.invalidations += 1
+        try:
+            for key in keys:  # fences first: a load finishing between the two steps sees the new one
+                await self.backend.set(f'fence:{key}', uuid4().bytes, self.ttl)
+            await self.backend.delete(*keys)
+        except Exception:
+            self.errors += 1
+            logger.warning('Read cache backend failed', exc_info=True)
+
+    async def get_or_load(self, key: str | None, loader, dump, load):
+        """Return ``load(bytes)`` of the cached entry, or ``await loader()`` and store ``dump(value)``.
+
+        A ``None`` key bypasses the cache.
+        """
+        if key is None or self.ttl <= 0:
+            return await loader()
+        fence = None
+        try:
+            if (raw := await self.backend.get(key)) is not None:
+                self.hits += 1
+                return load(raw)
+            fence = await self.fence(key)  # read before loading, compared after storing
+        except Exception:
+            self.errors += 1
+            logger.warning('Read cache backend failed', exc_info=True)
+        self.misses += 1
+
+        if (future := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            raw = await asyncio.shield(future)
+            return None if raw is None else load(raw)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            raw = None if value is None else dump(value)
+            future.set_result(raw)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, even when nobody was waiting
+            raise
+        except BaseException:  # cancelled leader: release the waiters instead of hanging them
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+        if raw is None:
+            return None
+        try:
+            await self.backend.set(key, raw, self.ttl)
+            if await self.fence(key) != fence:  # invalidated while loading, the row may be stale
+                self.stale_drops += 1
+                await self.backend.delete(key)
+        except Exception:
+            self.errors += 1
+            logger.warning('Read cache backend failed', exc_info=True)
+        return load(raw)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'ttl_s': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'coalesced': self.coalesced,
+            'invalidations': self.invalidations,
+            'stale_drops': self.stale_drops,
+            'errors': self.errors,
+        }
+
+
+def model_codec(type_) -> tuple:
+    """``(dump, load)`` between ORM objects and JSON bytes of the pydantic ``type_``."""
+    adapter = TypeAdapter(type_)
+    return (lambda value: adapter.dump_json(adapter.validate_python(value, from_attributes=True)), adapter.validate_json)
+
+
+def create_read_cache() -> ReadCache:
+    if READ_CACHE_BACKEND == 'redis':
+        return ReadCache(RedisBackend(READ_CACHE_REDIS_URL), ttl=READ_CACHE_TTL)
+    return ReadCache(MemoryBackend(READ_CACHE_SIZE), ttl=READ_CACHE_TTL)
+
+
+read_cache = create_read_cache()
@@ -0,0 +1,118 @@
+### Weather recording policy: which requests become a weather row.
+# Requests are filtered by path and sampled per host before they are queued, and at most one
+# row per (hostname, country) is written per dedup interval.
+import logging
+import random
+
+from ..utils.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_list(value: str) -> tuple[str, ...]:
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def parse_rates(value: str) -> dict[str, float]:
+    """``'10.0.0.1=0.1,me=0'`` -> ``{'10.0.0.1': 0.1, 'me': 0.0}``"""
+    rates = {}
+    for item in parse_list(value):
+        host, _, rate = item.partition('=')
+        rates[host.strip()] = float(rate)
+    return rates
+
+
+class MemoryDedupStore:
+    """Per-process dedup keys, expiring after their TTL."""
+
+    def __init__(self, maxsize: int = 100000):
+        self._keys = TTLCache(maxsize=maxsize, ttl=1)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        if self._keys.get(key) is not None:
+            return False
+        self._keys.set(key, True, ttl=ttl)
+        return True
+
+
+class RedisDedupStore:
+    """Dedup keys shared by every worker and replica, via ``SET key NX PX`` on a Redis-compatible server.
+
+    Needs the optional ``redis`` package. When the server fails the row is recorded (fail open).
+    """
+
+    def __init__(self, url: str | None = None, client=None, prefix: str = 'weather-dedup:'):
+        if client is None:
+            try:
+                import redis.asyncio
+            except ImportError as e:
+                raise RuntimeError("WEATHER_DEDUP_REDIS_URL needs the 'redis' package (pip install redis)") from e
+            client = redis.asyncio.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        try:
+            return bool(await self.client.set(self.prefix + key, 1, nx=True, px=max(1, int(ttl * 1000))))
+        except Exception:
+            self.errors += 1
+            logger.warning('Weather dedup store failed, recording anyway', exc_info=True)
+            return True
+
+
+class RecordingPolicy:
+    """Decide which requests are recorded as weather rows and count the decisions.
+
+    ``admit`` runs on the request path: a path must start with one of ``allow_paths``
+    (when given) and none of ``deny_paths``, then it is kept with the host's sample rate
+    (``host_rates``, else ``sample_rate``). ``claim`` runs once the country is known and
+    lets through one row per (hostname, country) every ``dedup_interval`` seconds.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, host_rates: dict[str, float] | None = None,
+                 dedup_interval: float = 0, store=None, allow_paths=(), deny_paths=()):
+        self.sample_rate = sample_rate
+        self.host_rates = host_rates or {}
+        self.dedup_interval = dedup_interval
+        self.store = store if store is not None else MemoryDedupStore()
+        self.allow_paths = tuple(allow_paths)
+        self.deny_paths = tuple(deny_paths)
+
+        self.seen = 0
+        self.recorded = 0
+        self.suppressed_path = 0
+        self.suppressed_sampled = 0
+        self.suppressed_duplicate = 0
+
+    def admit(self, hostname: str, path: str) -> bool:
+        self.seen += 1
+        if (self.allow_paths and not path.startswith(self.allow_paths)) or path.startswith(self.deny_paths):
+            self.suppressed_path += 1
+            return False
+        rate = self.host_rates.get(hostname, self.sample_rate)
+        if rate < 1 and random.random() >= rate:
+            self.suppressed_sampled += 1
+            return False
+        return True
+
+    async def claim(self, hostname: str, country: str) -> bool:
+        if self.dedup_interval > 0 and not await self.store.claim(f'{hostname}|{country}', self.dedup_interval):
+            self.suppressed_duplicate += 1
+            return False
+        self.recorded += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'dedup_interval_s': self.dedup_interval,
+            'store': type(self.store).__name__,
+            'store_errors': getattr(self.store, 'errors', 0),
+            'seen': self.seen,
+            'recorded': self.recorded,
+            'suppressed_path': self.suppressed_path,
+            'suppressed_sampled': self.suppressed_sampled,
+            'suppressed_duplicate': self.suppressed_duplicate,
+        }
@@ -0,0 +1,160 @@
+### Per-request metrics: route latency, in-flight requests, DB and outbound HTTP time, Prometheus export.
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from sqlalchemy import event
+
+from ..utils.metrics import Histogram, prometheus_histogram, prometheus_samples
+
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')  # add a Server-Timing header
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestTiming:
+    """DB and outbound HTTP time of one request, added up by the engine and HTTP client hooks."""
+
+    __slots__ = ('db_seconds', 'db_queries', 'http_seconds', 'http_calls')
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.http_seconds = 0.0
+        self.http_calls = 0
+
+    def server_timing(self, app_seconds: float) -> str:
+        return (f'app;dur={app_seconds * 1000:.1f}, db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries", '
+                f'http;dur={self.http_seconds * 1000:.1f};desc="{self.http_calls} calls"')
+
+
+# Set by the middleware for each request; the threadpool copies it to sync DB calls.
+current_timing: ContextVar[RequestTiming | None] = ContextVar('current_timing', default=None)
+
+
+class RequestMetrics:
+    """Histograms keyed by label values. Updates are plain dict/attribute writes, no locks.
+
+    Requests and outbound calls are observed on the event loop. Queries run outside a request
+    (batch writes, retention) are added from worker threads, so those totals are approximate.
+    """
+
+    def __init__(self):
+        self.duration: dict[tuple, Histogram] = {}  # (method, route, status)
+        self.db_seconds: dict[tuple, Histogram] = {}  # (method, route)
+        self.db_queries: dict[tuple, int] = defaultdict(int)  # (method, route)
+        self.in_flight: dict[tuple, int] = defaultdict(int)  # (method,)
+        self.outbound: dict[tuple, Histogram] = {}  # (host, status)
+        self.background_db_seconds = 0.0
+        self.background_db_queries = 0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, timing: RequestTiming):
+        key = (method, route)
+        if (histogram := self.duration.get((*key, status))) is None:
+            histogram = self.duration[(*key, status)] = Histogram()
+        histogram.observe(seconds)
+        if (histogram := self.db_seconds.get(key)) is None:
+            histogram = self.db_seconds[key] = Histogram()
+        histogram.observe(timing.db_seconds)
+        self.db_queries[key] += timing.db_queries
+
+    def observe_query(self, seconds: float):
+        if (timing := current_timing.get()) is None:
+            self.background_db_seconds += seconds
+            self.background_db_queries += 1
+        else:
+            timing.db_seconds += seconds
+            timing.db_queries += 1
+
+    def observe_outbound(self, host: str, status: int | str, seconds: float):
+        if (histogram := self.outbound.get((host, status))) is None:
+            histogram = self.outbound[(host, status)] = Histogram()
+        histogram.observe(seconds)
+        if (timing := current_timing.get()) is not None:
+            timing.http_seconds += seconds
+            timing.http_calls += 1
+
+    def render(self) -> str:
+        lines = [
+            *prometheus_samples('http_requests_in_flight', 'Requests being served.', 'gauge', self.in_flight, ('method',)),
+            *prometheus_histogram('http_request_duration_seconds', 'Request latency until the response is sent.',
+                                  self.duration, ('method', 'route', 'status')),
+            *prometheus_histogram('http_request_db_seconds', 'Database time spent by each request.',
+                                  self.db_seconds, ('method', 'route')),
+            *prometheus_samples('http_request_db_queries_total', 'SQL statements run by requests.', 'counter',
+                                self.db_queries, ('method', 'route')),
+            *prometheus_samples('db_background_seconds_total', 'Database time outside requests.', 'counter',
+                                {(): self.background_db_seconds}),
+            *prometheus_samples('db_background_queries_total', 'SQL statements outside requests.', 'counter',
+                                {(): self.background_db_queries}),
+            *prometheus_histogram('http_client_request_duration_seconds', 'Outbound HTTP call latency.',
+                                  self.outbound, ('host', 'status')),
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def time_queries(engine):
+    """Add each statement's execution time to the current request (or the background totals)."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def query_finished(conn, cursor, statement, parameters, context, executemany):
+        if (started := conn.info.pop('query_started', None)) is not None:
+            request_metrics.observe_query(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by method, route template and status.
+
+    Routes are labelled by their path template (``/api/v1/tasks/{id}``), unknown paths as
+    ``unmatched``. With ``SERVER_TIMING`` on, responses carry app, db and http durations.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+        self.routes: dict = {}  # endpoint -> path template
+
+    def route(self, scope) -> str:
+        # The router stores the matched endpoint in the shared scope.
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        if (path := self.routes.get(endpoint)) is None:
+            path = next((route.path for route in scope['app'].routes if getattr(route, 'endpoint', None) is endpoint), 'unmatched')
+            self.routes[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        in_flight = (scope['method'],)
+        timing, status = RequestTiming(), 500
+        token = current_timing.set(timing)
+        self.metrics.in_flight[in_flight] += 1
+        started = time.perf_counter()
+
+        async def send_timed(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if SERVER_TIMING:
+                    header = (b'server-timing', timing.server_timing(time.perf_counter() - started).encode())
+                    message = {**message, 'headers': [*message.get('headers', []), header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.in_flight[in_flight] -= 1
+            current_timing.reset(token)
+            self.metrics.observe_request(scope['method'], self.route(scope), status, elapsed, timing)
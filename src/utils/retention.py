@@ -0,0 +1,75 @@
+### Rolling retention: periodically delete rows older than a cutoff so a table stays bounded.
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    """Every ``interval`` seconds call ``purge(cutoff)`` to delete rows created before ``now - retention``.
+
+    ``purge`` is a blocking callable returning the number of deleted rows and runs in
+    the threadpool. A zero ``retention`` disables the job.
+    """
+
+    def __init__(self, purge, retention: timedelta, interval: float = 3600):
+        self.purge = purge
+        self.retention = retention
+        self.interval = interval
+        self.running = False
+        self._task: asyncio.Task | None = None
+
+        self.runs = 0
+        self.deleted = 0
+        self.failed = 0
+        self.last_cutoff: datetime | None = None
+
+    async def run_once(self) -> int:
+        # created_at columns hold naive UTC timestamps, database.use_utc_sessions pins PostgreSQL to UTC.
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.retention
+        try:
+            deleted = await run_in_threadpool(self.purge, cutoff)
+        except Exception:
+            self.failed += 1
+            logger.exception('Retention purge before %s failed', cutoff)
+            return 0
+        self.runs += 1
+        self.deleted += deleted
+        self.last_cutoff = cutoff
+        return deleted
+
+    async def start(self):
+        if self.running or not self.retention:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while self.running:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            'retention_s': self.retention.total_seconds(),
+            'interval_s': self.interval,
+            'running': self.running,
+            'runs': self.runs,
+            'deleted': self.deleted,
+            'failed': self.failed,
+            'last_cutoff': self.last_cutoff.isoformat() if self.last_cutoff else None,
+        }
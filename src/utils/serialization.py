@@ -0,0 +1,26 @@
+### Fast JSON path for list endpoints: ORM rows to response bytes in one pydantic-core pass.
+from functools import cache
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@cache
+def type_adapter(type_) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+
+def dump_json(type_, content) -> bytes:
+    """Validate ``content`` (ORM objects or models) as ``type_`` and encode it straight to JSON bytes."""
+    adapter = type_adapter(type_)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+
+
+def json_response(type_, content, response: Response) -> Response:
+    """Return ``content`` as a ready JSON response, skipping FastAPI's jsonable_encoder/json.dumps step.
+
+    The route keeps its ``response_model`` for the OpenAPI schema. Headers set on the injected
+    ``response`` (X-Next-Cursor) are copied over, FastAPI only merges them for non-Response returns.
+    """
+    result = Response(dump_json(type_, content), media_type='application/json')
+    result.headers.raw.extend(response.headers.raw)
+    return result
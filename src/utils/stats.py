@@ -0,0 +1,25 @@
+### Short-lived caches of the aggregate (stats) endpoints. Task writes invalidate the task stats.
+import os
+
+from ..utils.cache import TTLCache
+
+
+STATS_CACHE_SIZE = int(os.getenv('STATS_CACHE_SIZE', 256))
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 30))
+
+task_stats_cache = TTLCache(maxsize=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL, negative_ttl=0)
+weather_stats_cache = TTLCache(maxsize=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL, negative_ttl=0)
+
+# Part of every task stats key: a query that started before an invalidation stores its
+# (possibly stale) result under the old generation, where nobody looks it up.
+_task_generation = 0
+
+
+def task_stats_key(**params) -> tuple:
+    return (_task_generation, *sorted(params.items()))
+
+
+def invalidate_task_stats():
+    global _task_generation
+    _task_generation += 1
+    task_stats_cache.clear()
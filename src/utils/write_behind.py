@@ -0,0 +1,91 @@
+### Write-behind buffer: collect rows in memory and persist them in batches.
+import asyncio
+import logging
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Buffer rows and hand them to ``writer`` in batches of at most ``batch_size``.
+
+    A flush happens when ``batch_size`` rows are buffered or every ``flush_interval``
+    seconds, whichever comes first. ``writer`` is a blocking callable and runs in
+    the threadpool. Rows beyond ``max_rows`` are dropped and counted.
+    """
+
+    def __init__(self, writer, batch_size: int = 500, flush_interval: float = 2.0, max_rows: int = 10000):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.running = False
+        self._rows: list = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+        self.buffered = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def add(self, row) -> bool:
+        if len(self._rows) >= self.max_rows:
+            self.dropped += 1
+            return False
+        self._rows.append(row)
+        self.buffered += 1
+        if self._wakeup is not None and len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self):
+        while self._rows:
+            batch, self._rows = self._rows[:self.batch_size], self._rows[self.batch_size:]
+            try:
+                await run_in_threadpool(self.writer, batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception:
+                self.failed += len(batch)
+                logger.exception('Write-behind flush of %s rows failed', len(batch))
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self.running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flusher and write everything still buffered."""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        await self._task
+        await self.flush()
+        self._task = None
+        self._wakeup = None
+
+    async def _run(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._rows),
+            'max_rows': self.max_rows,
+            'buffered': self.buffered,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+        }